@@ -2,11 +2,27 @@ from flask import Flask, redirect, url_for
 from flask_login import LoginManager, current_user
 from models import db, User
 import os
+import threading
 
 # ✅ Fix for OpenMP runtime conflict (libomp/libiomp5)
 os.environ["KMP_DUPLICATE_LIB_OK"] = "TRUE"
 
 
+def warmup_models():
+    """Load the lazily-initialized models now rather than on first use."""
+    from llm import get_genai, LLM_BACKEND
+    from docs.extract import load_ocr_stack
+    from docs.summarizer import load as load_summarizer, SUMMARIZER_SOCKET
+    if LLM_BACKEND != "fake":
+        get_genai()
+    try:
+        load_ocr_stack()
+    except ImportError as e:
+        print("WARMUP: OCR stack unavailable:", e)
+    if not SUMMARIZER_SOCKET:   # otherwise the summarizer server holds the model
+        load_summarizer()
+
+
 def create_app():
     app = Flask(__name__, instance_relative_config=True)
 
@@ -19,6 +35,8 @@ def create_app():
     app.config.from_pyfile('../config.py')
 
     db.init_app(app)
+    with app.app_context():
+        db.create_all()   # creates tables added since users.db was made
 
     login_manager = LoginManager()
     login_manager.init_app(app)
@@ -35,12 +53,24 @@ def create_app():
     from docs.routes_docs import docs_bp
     app.register_blueprint(docs_bp)
 
+    from docs import ingest
+    ingest.init_app(app)
+
     from rag.routes_rag import rag_bp
     app.register_blueprint(rag_bp)
 
     from quiz import quiz_bp
     app.register_blueprint(quiz_bp)
 
+    @app.cli.command("warmup")
+    def warmup_command():
+        """Load BART, the OCR stack and the Gemini client once."""
+        warmup_models()
+        print("Models loaded.")
+
+    if app.config.get("WARMUP_MODELS"):
+        threading.Thread(target=warmup_models, name="warmup", daemon=True).start()
+
     @app.route('/')
     def home():
         if not current_user.is_authenticated:
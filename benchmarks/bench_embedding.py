@@ -0,0 +1,53 @@
+"""Offline throughput benchmark for docs.embedding.embed_stream.
+
+Uses the stub embedder with a simulated round-trip latency, so no API key
+or network is needed. Run from the project root:
+
+    python -m benchmarks.bench_embedding --file uploads/machine_learning_100k_words.txt
+"""
+import argparse
+import time
+from functools import partial
+
+import numpy as np
+
+from docs.embedding import embed_stream
+from llm import stub_embed_batch
+
+
+def chunk_words(text, chunk_words=180, overlap_words=40):
+    # same windows as docs.routes_docs.iter_chunks
+    words = text.split()
+    stride = max(1, chunk_words - overlap_words)
+    return [" ".join(words[i:i + chunk_words]) for i in range(0, len(words), stride)]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--file", default="uploads/machine_learning_100k_words.txt")
+    ap.add_argument("--latency", type=float, default=0.15, help="simulated seconds per API call")
+    ap.add_argument("--configs", default="1x1,16x1,64x1,64x4,64x8",
+                    help="comma list of BATCHxWORKERS")
+    args = ap.parse_args()
+
+    with open(args.file, "rb") as fh:
+        text = fh.read().decode("utf-8", errors="ignore")
+    chunks = chunk_words(text)
+    print(f"{args.file}: {len(chunks)} chunks, simulated latency {args.latency:.3f}s/call")
+
+    embedder = partial(stub_embed_batch, latency=args.latency)
+    baseline = None
+    for cfg in args.configs.split(","):
+        batch, workers = (int(x) for x in cfg.split("x"))
+        t0 = time.perf_counter()
+        X = np.vstack([X for _, X in embed_stream(chunks, embed_batch=embedder, batch_size=batch, workers=workers)])
+        dt = time.perf_counter() - t0
+        if baseline is None:
+            baseline = X
+        assert X.shape[0] == len(chunks)
+        same = bool((X == baseline).all())
+        print(f"batch={batch:<4} workers={workers:<3} {dt:8.2f}s  {len(chunks) / dt:10.1f} chunks/s  order_ok={same}")
+
+
+if __name__ == "__main__":
+    main()
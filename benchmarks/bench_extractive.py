@@ -0,0 +1,41 @@
+"""Latency of docs.extractive.extractive_summarize vs document length.
+
+Uses prefixes of one long file at the 35% target the /summarize routes
+compute; time per word should stay flat as the prefix grows. Run from the
+project root:
+
+    python -m benchmarks.bench_extractive
+    python -m benchmarks.bench_extractive --sizes 1000,10000,100000 uploads/machine_learning_100k_words.txt
+"""
+import argparse
+import time
+
+from docs.extractive import extractive_summarize
+from docs.extract import extract_text_from_file
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("file", nargs="?", default="uploads/machine_learning_100k_words.txt")
+    ap.add_argument("--sizes", default="1000,5000,20000,50000,100000")
+    ap.add_argument("--ratio", type=float, default=0.35)
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    words = extract_text_from_file(args.file, args.file).split()
+    extractive_summarize(" ".join(words[:500]), 100)   # import sklearn outside the timings
+    print(f"{'words':>8} {'target':>8} {'out':>8} {'ms':>8} {'us/word':>8}")
+    for n in (int(s) for s in args.sizes.split(",")):
+        n = min(n, len(words))
+        text = " ".join(words[:n])
+        target = max(35, int(n * args.ratio))
+        best = float("inf")
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            out = extractive_summarize(text, target)
+            best = min(best, time.perf_counter() - t0)
+        print(f"{n:8d} {target:8d} {len(out.split()):8d} {best * 1000:8.1f} {best / n * 1e6:8.2f}")
+
+
+if __name__ == "__main__":
+    main()
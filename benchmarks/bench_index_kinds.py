@@ -0,0 +1,111 @@
+"""Recall@k vs memory vs latency for the INDEX_KIND variants (flat, sq8, pq).
+
+Pools the vectors of every index under instance/indexes and instance/blobs
+(exact ones from the embedding store when present), queries with perturbed
+corpus vectors, and compares each kind against exact flat search, with and
+without re-scoring a k * factor shortlist. Run from the project root:
+
+    python -m benchmarks.bench_index_kinds --k 4 --pq-m 48,96,192
+    python -m benchmarks.bench_index_kinds --synthetic 50000   # stub vectors, no corpus needed
+
+Stub vectors are i.i.d. random, the worst case for quantization; numbers
+from a real corpus are the ones to choose INDEX_KIND by.
+"""
+import argparse
+import glob
+import os
+import time
+
+import faiss
+import numpy as np
+
+from docs import index_factory
+from docs.index_store import INDEX_DIR, FAISS_READ_FLAGS, read_chunks
+from docs.blob_store import BLOB_DIR
+from docs.embedding import EMB_MODEL, normalize_rows
+from llm import stub_embed_batch
+from docs.embedding_store import EMBEDDING_STORE, chunk_key
+
+
+def load_corpus():
+    parts = []
+    paths = glob.glob(os.path.join(INDEX_DIR, "*.faiss")) + glob.glob(os.path.join(BLOB_DIR, "*", "index.faiss"))
+    for fp in paths:
+        base = fp[:-len(".faiss")]
+        chunks = read_chunks(base + ".chunks", base + ".meta.json")
+        index = faiss.read_index(fp, FAISS_READ_FLAGS)
+        if chunks is None or index.ntotal == 0:
+            continue
+        keys = [chunk_key(c, EMB_MODEL) for c in chunks]
+        vecs = EMBEDDING_STORE.get_many(keys)
+        if len(keys) == index.ntotal and all(k in vecs for k in keys):
+            parts.append(np.vstack([vecs[k] for k in keys]))
+        else:
+            parts.append(index.reconstruct_n(0, index.ntotal))
+    print(f"{len(paths)} indexes under instance/")
+    return np.vstack(parts).astype(np.float32) if parts else None
+
+
+def recall(found, truth):
+    return float(np.mean([len(set(f) & set(t)) / len(t) for f, t in zip(found, truth)]))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--k", type=int, default=4)
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--pq-m", default="48,96,192", help="comma list of PQ sub-quantizer counts")
+    ap.add_argument("--synthetic", type=int, default=0, help="use N stub vectors instead of instance/")
+    args = ap.parse_args()
+
+    X = None if args.synthetic else load_corpus()
+    if X is None:
+        n = args.synthetic or 20000
+        X = normalize_rows(stub_embed_batch([f"synthetic chunk {i}" for i in range(n)]))
+        print(f"using {n} synthetic stub vectors")
+    X = np.unique(X, axis=0)   # re-indexed documents repeat vectors; ties blur recall
+    n, d = X.shape
+    rng = np.random.default_rng(0)
+    Q = normalize_rows(X[rng.choice(n, args.queries)] + 0.1 * rng.standard_normal((args.queries, d), dtype=np.float32))
+    k = min(args.k, n)
+    _, truth = index_factory.make_index(X, "flat").search(Q, k)
+    factor = index_factory.INDEX_RESCORE_FACTOR
+    print(f"{n} vectors x {d} dims, {args.queries} queries, recall@{k}, rescore shortlist {k}x{factor}")
+    print(f"{'kind':<14} {'bytes/vec':>9} {'total MB':>9} {'build s':>8} {'p50 ms':>7} "
+          f"{'recall':>7} {'+rescore':>9} {'p50 ms':>7}")
+
+    variants = [("flat", None), ("sq8", None)] + [("pq", int(m)) for m in args.pq_m.split(",")]
+    for kind, m in variants:
+        if m is not None:
+            if d % m:
+                continue
+            index_factory.INDEX_PQ_M = m
+        t0 = time.perf_counter()
+        index = index_factory.make_index(X, kind)
+        build = time.perf_counter() - t0
+        size = faiss.serialize_index(index).nbytes
+        label = index_factory.code_string(kind, n, d)
+
+        lat, found = [], []
+        for q in Q:
+            t0 = time.perf_counter()
+            _, ids = index.search(q.reshape(1, -1), k)
+            lat.append(time.perf_counter() - t0)
+            found.append(ids[0])
+
+        # re-scoring: wider approximate search, exact dot products on the shortlist
+        r_lat, r_found = [], []
+        for q in Q:
+            t0 = time.perf_counter()
+            _, ids = index.search(q.reshape(1, -1), k * factor)
+            ids = ids[0][ids[0] >= 0]
+            exact = X[ids] @ q
+            r_found.append(ids[np.argsort(-exact)[:k]])
+            r_lat.append(time.perf_counter() - t0)
+
+        print(f"{label:<14} {size / n:9.1f} {size / 1e6:9.2f} {build:8.2f} {np.median(lat) * 1000:7.3f} "
+              f"{recall(found, truth):7.3f} {recall(r_found, truth):9.3f} {np.median(r_lat) * 1000:7.3f}")
+
+
+if __name__ == "__main__":
+    main()
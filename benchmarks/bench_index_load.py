@@ -0,0 +1,135 @@
+"""Cold and warm load time: JSON chunk lists vs the mmapped chunk store.
+
+For every index under instance/indexes and instance/blobs (or a synthetic
+one built from --file with --synthetic or when there are none) this times "open the index and
+read 4 random chunks", the path every retrieval takes on a cache miss:
+
+    json   json.load of the whole .meta.json list
+    mmap   docs.chunk_store.ChunkStore (footer + 4 byte ranges)
+    faiss  faiss.read_index, default vs docs.index_store.FAISS_READ_FLAGS
+
+Cold runs drop the files from the page cache with posix_fadvise(DONTNEED)
+first (Linux; without it every run is warm). Run from the project root:
+
+    python -m benchmarks.bench_index_load --repeat 20
+"""
+import argparse
+import glob
+import json
+import os
+import random
+import tempfile
+import time
+
+import faiss
+import numpy as np
+
+from docs.chunk_store import ChunkStore, write_chunks
+from docs.index_store import INDEX_DIR, FAISS_READ_FLAGS
+from docs.blob_store import BLOB_DIR
+from docs.embedding import normalize_rows
+from llm import stub_embed_batch
+
+
+def _drop_cache(path):
+    if not hasattr(os, "posix_fadvise"):
+        return False
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    finally:
+        os.close(fd)
+    return True
+
+
+def _corpus(tmp, text_file, synthetic):
+    """-> list of (faiss path, chunks path, json path), converting as needed."""
+    out = []
+    faiss_paths = [] if synthetic else (glob.glob(os.path.join(INDEX_DIR, "*.faiss")) +
+                                        glob.glob(os.path.join(BLOB_DIR, "*", "index.faiss")))
+    for i, fp in enumerate(faiss_paths):
+        base = fp[:-len(".faiss")]
+        chunks_path, json_path = base + ".chunks", base + ".meta.json"
+        if os.path.exists(json_path):
+            with open(json_path, encoding="utf-8") as f:
+                chunks = json.load(f)["chunks"]
+        elif os.path.exists(chunks_path):
+            chunks = list(ChunkStore(chunks_path))
+        else:
+            continue
+        # private copies of both formats so nothing in instance/ is touched
+        cp, jp = os.path.join(tmp, f"{i}.chunks"), os.path.join(tmp, f"{i}.meta.json")
+        write_chunks(cp, chunks)
+        with open(jp, "w", encoding="utf-8") as f:
+            json.dump({"chunks": chunks}, f, ensure_ascii=False)
+        out.append((fp, cp, jp))
+    if out:
+        return out
+
+    with open(text_file, "rb") as fh:
+        words = fh.read().decode("utf-8", errors="ignore").split()
+    chunks = [" ".join(words[i:i + 180]) for i in range(0, len(words), 140)]
+    index = faiss.IndexFlatIP(768)
+    index.add(normalize_rows(stub_embed_batch(chunks)))
+    fp, cp, jp = (os.path.join(tmp, n) for n in ("synthetic.faiss", "synthetic.chunks", "synthetic.meta.json"))
+    faiss.write_index(index, fp)
+    write_chunks(cp, chunks)
+    with open(jp, "w", encoding="utf-8") as f:
+        json.dump({"chunks": chunks}, f, ensure_ascii=False)
+    print(f"synthetic index: {len(chunks)} chunks from {text_file}")
+    return [(fp, cp, jp)]
+
+
+def _load_json(path, picks):
+    with open(path, encoding="utf-8") as f:
+        chunks = json.load(f)["chunks"]
+    return [chunks[i % len(chunks)] for i in picks]
+
+
+def _load_mmap(path, picks):
+    store = ChunkStore(path)
+    return [store[i % len(store)] for i in picks]
+
+
+def _time(fn, path, repeat, cold):
+    best = []
+    for _ in range(repeat):
+        if cold:
+            _drop_cache(path)
+        t0 = time.perf_counter()
+        fn(path)
+        best.append((time.perf_counter() - t0) * 1000)
+    return float(np.median(best))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--repeat", type=int, default=20)
+    ap.add_argument("--file", default="uploads/machine_learning_100k_words.txt")
+    ap.add_argument("--synthetic", action="store_true", help="ignore instance/, index --file instead")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        corpus = _corpus(tmp, args.file, args.synthetic)
+        can_drop = hasattr(os, "posix_fadvise")
+        print(f"{len(corpus)} indexes, median of {args.repeat} runs, cold runs "
+              f"{'drop the page cache' if can_drop else 'UNAVAILABLE (no posix_fadvise)'}")
+        print(f"{'index':<28} {'chunks':>7} {'json MB':>8} {'json cold':>10} {'json warm':>10} "
+              f"{'mmap cold':>10} {'mmap warm':>10} {'faiss':>8} {'faiss mm':>9}")
+        for fp, cp, jp in corpus:
+            picks = [random.randrange(1 << 30) for _ in range(4)]
+            n = len(ChunkStore(cp))
+            row = [
+                _time(lambda p: _load_json(p, picks), jp, args.repeat, True),
+                _time(lambda p: _load_json(p, picks), jp, args.repeat, False),
+                _time(lambda p: _load_mmap(p, picks), cp, args.repeat, True),
+                _time(lambda p: _load_mmap(p, picks), cp, args.repeat, False),
+                _time(faiss.read_index, fp, args.repeat, False),
+                _time(lambda p: faiss.read_index(p, FAISS_READ_FLAGS), fp, args.repeat, False),
+            ]
+            name = os.path.relpath(fp)[-28:]
+            print(f"{name:<28} {n:7d} {os.path.getsize(jp) / 1e6:8.2f} " + " ".join(f"{v:8.2f}ms" for v in row))
+
+
+if __name__ == "__main__":
+    main()
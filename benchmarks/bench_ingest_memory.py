@@ -0,0 +1,79 @@
+"""Peak memory of chunk -> embed -> index: whole-document lists vs streaming.
+
+Every (mode, size) runs in a fresh subprocess. Each builds a flat index and
+a chunk store for a synthetic document of N words with the stub embedder (no
+network), and reports peak RSS above the baseline taken once the text exists.
+"overhead" subtracts the finished index itself, which any in-memory index has
+to hold. "list" is the old path (every chunk in a list, every vector in
+one matrix, make_index + write_chunks); "stream" is index_chunks() with a
+ChunkWriter.
+Run from the project root:
+
+    python -m benchmarks.bench_ingest_memory --sizes 100000,400000,1600000
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def _rss_bytes():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def child(mode: str, n_words: int):
+    import faiss
+    import numpy as np
+    from docs.chunk_store import ChunkWriter, write_chunks
+    from docs.embedding import embed_stream
+    from llm import stub_embed_batch
+    from docs.index_factory import make_index
+    from docs.routes_docs import count_chunks, index_chunks, iter_chunks, iter_words
+
+    vocab = [f"term{i}" for i in range(5000)]
+    text = " ".join(vocab[(i * 7919) % len(vocab)] for i in range(n_words))
+    out = tempfile.mkdtemp()
+    base = _rss_bytes()
+    t0 = time.perf_counter()
+    if mode == "list":
+        chunks = list(iter_chunks(iter_words(text)))
+        X = np.vstack([X for _, X in embed_stream(chunks, embed_batch=stub_embed_batch)])
+        index = make_index(X)
+        write_chunks(os.path.join(out, "index.chunks"), chunks)
+    else:
+        with ChunkWriter(os.path.join(out, "index.chunks")) as writer:
+            index = index_chunks(iter_chunks(iter_words(text)), writer.append, total=count_chunks(n_words),
+                                 store=None, embed_batch=stub_embed_batch)
+    faiss.write_index(index, os.path.join(out, "index.faiss"))
+    secs = time.perf_counter() - t0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    index_bytes = index.ntotal * index.d * 4
+    print(json.dumps({"chunks": index.ntotal, "secs": secs, "peak": peak - base, "index": index_bytes}))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", default="100000,400000,1600000")
+    ap.add_argument("--modes", default="list,stream")
+    ap.add_argument("--child", nargs=2, help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.child:
+        return child(args.child[0], int(args.child[1]))
+
+    print(f"{'mode':<7} {'words':>9} {'chunks':>7} {'secs':>6} {'peak MB':>8} {'index MB':>9} {'overhead MB':>12}")
+    for n in (int(s) for s in args.sizes.split(",")):
+        for mode in args.modes.split(","):
+            res = subprocess.run([sys.executable, "-m", "benchmarks.bench_ingest_memory", "--child", mode, str(n)],
+                                 capture_output=True, text=True, check=True)
+            r = json.loads(res.stdout.strip().splitlines()[-1])
+            print(f"{mode:<7} {n:9d} {r['chunks']:7d} {r['secs']:6.2f} {r['peak'] / 1e6:8.1f} "
+                  f"{r['index'] / 1e6:9.1f} {(r['peak'] - r['index']) / 1e6:12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Search latency of a per-user library index (docs.library_index).
+
+Builds a synthetic library of --docs documents x --chunks chunks (random
+unit vectors, 768-d) as flat and as IVF, then times whole-library and
+single-document searches. No database or API key needed. Run from the
+project root:
+
+    python -m benchmarks.bench_library_search --docs 2000 --chunks 30
+"""
+import argparse
+import time
+import numpy as np
+
+from docs import library_index as L
+
+
+def _time(fn, n):
+    lat = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        fn()
+        lat.append((time.perf_counter() - t0) * 1000)
+    lat.sort()
+    return lat[len(lat) // 2], lat[int(len(lat) * 0.99) - 1]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--docs", type=int, default=2000)
+    ap.add_argument("--chunks", type=int, default=30)
+    ap.add_argument("--dim", type=int, default=768)
+    ap.add_argument("--queries", type=int, default=200)
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(0)
+    n = args.docs * args.chunks
+    X = rng.standard_normal((n, args.dim), dtype=np.float32)
+    X /= np.linalg.norm(X, axis=1, keepdims=True)
+    ids = np.array([L.chunk_id(d, c) for d in range(1, args.docs + 1) for c in range(args.chunks)], dtype=np.int64)
+    Q = X[rng.choice(n, args.queries)] + 0.05 * rng.standard_normal((args.queries, args.dim), dtype=np.float32)
+    print(f"{args.docs} docs x {args.chunks} chunks = {n} vectors, nprobe={L.LIBRARY_NPROBE}")
+
+    t0 = time.perf_counter()
+    flat = L.new_flat(X, ids)
+    print(f"flat build {time.perf_counter() - t0:.2f}s")
+    t0 = time.perf_counter()
+    ivf = L.new_ivf(X, ids)
+    print(f"ivf  build {time.perf_counter() - t0:.2f}s")
+
+    truth = [L.search_index(flat, "flat", q, 1)[0][1:] for q in Q]
+    for name, index in (("flat", flat), ("ivf", ivf)):
+        it = iter(range(10 ** 9))
+        p50, p99 = _time(lambda: L.search_index(index, name, Q[next(it) % len(Q)], 4), args.queries)
+        recall = np.mean([L.search_index(index, name, q, 1)[0][1:] == t for q, t in zip(Q, truth)])
+        doc = args.docs // 2
+        f50, f99 = _time(lambda: L.search_index(index, name, Q[0], 4, doc_ids=[doc]), args.queries)
+        print(f"{name:<5} library p50 {p50:6.2f}ms p99 {p99:6.2f}ms recall@1 {recall:.3f} | "
+              f"one doc p50 {f50:6.2f}ms p99 {f99:6.2f}ms")
+
+    t0 = time.perf_counter()
+    ivf.remove_ids(L._doc_range(1))
+    print(f"remove one doc from ivf: {(time.perf_counter() - t0) * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
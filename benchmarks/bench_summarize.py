@@ -0,0 +1,44 @@
+"""Words/sec of docs.summarizer.bart_summarize on the sample uploads.
+
+Uses the same 35% target the /summarize routes compute. Run from the
+project root (downloads facebook/bart-large-cnn on first use):
+
+    python -m benchmarks.bench_summarize
+    python -m benchmarks.bench_summarize --max-words 20000 uploads/machine_learning_100k_words.txt
+"""
+import argparse
+import glob
+import time
+
+from docs import summarizer
+from docs.extract import extract_text_from_file
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("files", nargs="*")
+    ap.add_argument("--max-words", type=int, default=0, help="truncate inputs (0 = whole file)")
+    ap.add_argument("--ratio", type=float, default=0.35)
+    args = ap.parse_args()
+
+    files = args.files or sorted(glob.glob("uploads/*.pdf") + glob.glob("uploads/*.txt"))
+    print(f"threads={summarizer.SUMMARY_THREADS} segment_tokens={summarizer.SUMMARY_SEGMENT_TOKENS} "
+          f"batch={summarizer.SUMMARY_BATCH_SIZE}")
+    for path in files:
+        text = extract_text_from_file(path, path)
+        words = text.split()
+        if args.max_words:
+            words = words[:args.max_words]
+            text = " ".join(words)
+        target = max(35, int(len(words) * args.ratio))
+        n_segments = len(summarizer.split_segments(text))
+
+        t0 = time.perf_counter()
+        out = summarizer.bart_summarize(text, target)
+        dt = time.perf_counter() - t0
+        print(f"{path}: {len(words)} words, {n_segments} segments, target {target} -> "
+              f"{len(out.split())} words in {dt:.1f}s ({len(words) / dt:.1f} words/s)")
+
+
+if __name__ == "__main__":
+    main()
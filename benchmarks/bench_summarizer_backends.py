@@ -0,0 +1,131 @@
+"""Compare summarizer inference backends against the fp32 baseline.
+
+Every backend runs in its own subprocess (SUMMARIZER_BACKEND=<mode>) so peak
+RSS is measured per backend. Reports model load time, per-file latency,
+peak RSS and ROUGE-1/2/L F1 of each backend's summaries against fp32's.
+Run from the project root:
+
+    python -m benchmarks.bench_summarizer_backends --modes fp32,int8,bf16 --max-words 1500
+"""
+import argparse
+import glob
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+from collections import Counter
+
+
+# ------------------- ROUGE (F1, whitespace/lowercase tokens) -------------------
+def _tokens(text):
+    return re.findall(r"\w+", text.lower())
+
+
+def _ngram_f1(ref, hyp, n):
+    r = Counter(tuple(ref[i:i + n]) for i in range(len(ref) - n + 1))
+    h = Counter(tuple(hyp[i:i + n]) for i in range(len(hyp) - n + 1))
+    overlap = sum((r & h).values())
+    if not overlap:
+        return 0.0
+    p, rc = overlap / sum(h.values()), overlap / sum(r.values())
+    return 2 * p * rc / (p + rc)
+
+
+def _lcs_f1(ref, hyp):
+    if not ref or not hyp:
+        return 0.0
+    prev = [0] * (len(hyp) + 1)
+    for a in ref:
+        cur = [0]
+        for j, b in enumerate(hyp):
+            cur.append(prev[j] + 1 if a == b else max(prev[j + 1], cur[j]))
+        prev = cur
+    lcs = prev[-1]
+    if not lcs:
+        return 0.0
+    p, rc = lcs / len(hyp), lcs / len(ref)
+    return 2 * p * rc / (p + rc)
+
+
+def rouge(ref_text, hyp_text):
+    ref, hyp = _tokens(ref_text), _tokens(hyp_text)
+    return {"rouge1": _ngram_f1(ref, hyp, 1), "rouge2": _ngram_f1(ref, hyp, 2), "rougeL": _lcs_f1(ref, hyp)}
+
+
+# ------------------- worker (one backend per process) -------------------
+def _peak_rss_mb():
+    try:
+        import resource
+    except ImportError:   # Windows
+        return float("nan")
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def run_worker(files, max_words, ratio):
+    from docs import summarizer
+    from docs.extract import extract_text_from_file
+
+    t0 = time.perf_counter()
+    summarizer.load()
+    load_s = time.perf_counter() - t0
+
+    results = []
+    for path in files:
+        words = extract_text_from_file(path, path).split()
+        if max_words:
+            words = words[:max_words]
+        target = max(35, int(len(words) * ratio))
+        t0 = time.perf_counter()
+        out = summarizer.bart_summarize(" ".join(words), target)
+        results.append({"file": path, "words": len(words), "seconds": time.perf_counter() - t0, "summary": out})
+    print(json.dumps({"load_seconds": load_s, "peak_rss_mb": _peak_rss_mb(), "results": results}))
+
+
+# ------------------- driver -------------------
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("files", nargs="*")
+    ap.add_argument("--modes", default="fp32,int8,bf16")
+    ap.add_argument("--max-words", type=int, default=1500, help="truncate inputs (0 = whole file)")
+    ap.add_argument("--ratio", type=float, default=0.35)
+    ap.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    files = args.files or sorted(glob.glob("uploads/*.pdf") + glob.glob("uploads/*.txt"))
+    if args.worker:
+        run_worker(files, args.max_words, args.ratio)
+        return
+
+    modes = args.modes.split(",")
+    if "fp32" not in modes:
+        modes.insert(0, "fp32")   # the ROUGE reference
+    runs = {}
+    for mode in modes:
+        env = dict(os.environ, SUMMARIZER_BACKEND=mode)
+        cmd = [sys.executable, "-m", "benchmarks.bench_summarizer_backends", "--worker",
+               "--max-words", str(args.max_words), "--ratio", str(args.ratio), *files]
+        proc = subprocess.run(cmd, env=env, capture_output=True, text=True)
+        if proc.returncode != 0:
+            print(f"{mode}: failed\n{proc.stderr.strip().splitlines()[-1] if proc.stderr else ''}")
+            continue
+        runs[mode] = json.loads(proc.stdout.strip().splitlines()[-1])
+
+    base = runs.get("fp32")
+    print(f"{'mode':<6} {'load s':>7} {'total s':>8} {'x fp32':>7} {'RSS MB':>8} {'R-1':>6} {'R-2':>6} {'R-L':>6}")
+    for mode, run in runs.items():
+        total = sum(r["seconds"] for r in run["results"])
+        speedup = (sum(r["seconds"] for r in base["results"]) / total) if base and total else float("nan")
+        scores = [rouge(b["summary"], r["summary"]) for b, r in zip(base["results"], run["results"])] if base else []
+        avg = {k: sum(s[k] for s in scores) / len(scores) for k in ("rouge1", "rouge2", "rougeL")} if scores else {}
+        print(f"{mode:<6} {run['load_seconds']:7.1f} {total:8.1f} {speedup:7.2f} {run['peak_rss_mb']:8.0f} "
+              f"{avg.get('rouge1', float('nan')):6.3f} {avg.get('rouge2', float('nan')):6.3f} "
+              f"{avg.get('rougeL', float('nan')):6.3f}")
+        for r in run["results"]:
+            print(f"    {r['file']}: {r['words']} words in {r['seconds']:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
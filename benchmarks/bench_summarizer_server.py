@@ -0,0 +1,102 @@
+"""Summaries/sec under concurrent load: in-process vs the batching server.
+
+N client threads each summarize the same set of texts. "in-process" is what
+a web worker did before: one generate() per request, serialized on the one
+model. "server" runs docs.summarizer_server on a temp Unix socket and sends
+the same requests through SummarizerClient, so concurrent segments share
+forward passes. Run from the project root:
+
+    python -m benchmarks.bench_summarizer_server --clients 8 --max-words 800
+    python -m benchmarks.bench_summarizer_server --synthetic   # no model download
+
+--synthetic swaps BART for a whitespace tokenizer and a sleep whose cost
+grows sub-linearly with batch size (--base-ms + --item-ms per input), which
+is the shape of a batched CPU forward pass; it measures the batching and
+queueing, not BART.
+"""
+import argparse
+import glob
+import os
+import tempfile
+import threading
+import time
+
+from docs import summarizer, summarizer_server
+from docs.extract import extract_text_from_file
+
+
+class _WhitespaceTokenizer:
+    def __call__(self, texts, **kw):
+        texts = [texts] if isinstance(texts, str) else texts
+        return {"input_ids": [t.split() for t in texts]}
+
+
+def run_clients(n_clients, texts, summarize):
+    lat = []
+    lock = threading.Lock()
+
+    def worker():
+        for text in texts:
+            t0 = time.perf_counter()
+            summarize(text, max(35, int(len(text.split()) * 0.35)))
+            with lock:
+                lat.append(time.perf_counter() - t0)
+
+    threads = [threading.Thread(target=worker) for _ in range(n_clients)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - t0
+    lat.sort()
+    return len(lat) / wall, lat[len(lat) // 2], lat[int(len(lat) * 0.95) - 1]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("files", nargs="*")
+    ap.add_argument("--clients", type=int, default=8)
+    ap.add_argument("--max-words", type=int, default=600)
+    ap.add_argument("--synthetic", action="store_true")
+    ap.add_argument("--base-ms", type=float, default=400)
+    ap.add_argument("--item-ms", type=float, default=60)
+    args = ap.parse_args()
+
+    if args.synthetic:
+        summarizer.load = lambda: (_WhitespaceTokenizer(), None)
+
+        def generate(texts, target_words):
+            time.sleep((args.base_ms + args.item_ms * len(texts)) / 1000)
+            return [" ".join(t.split()[:w]) for t, w in zip(texts, target_words)]
+        texts = [" ".join(f"word{i}" for i in range(args.max_words))] * 2
+    else:
+        generate = summarizer._generate
+        files = args.files or sorted(glob.glob("uploads/*.pdf") + glob.glob("uploads/*.txt"))
+        texts = [" ".join(extract_text_from_file(p, p).split()[:args.max_words]) for p in files]
+        summarizer.load()
+
+    model_lock = threading.Lock()   # one model per process: requests take turns
+
+    def in_process(text, target):
+        with model_lock:
+            return summarizer.summarize_local(text, target, generate=generate)
+
+    sock = os.path.join(tempfile.mkdtemp(), "summarizer.sock")
+    server = summarizer_server.SummarizerServer(sock, generate_batch=generate).listen()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    client = summarizer_server.SummarizerClient(sock)
+
+    print(f"{args.clients} clients x {len(texts)} texts, {args.max_words} words each, "
+          f"batch {server.batcher.max_batch}, wait {server.batcher.max_wait * 1000:.0f} ms")
+    print(f"{'mode':<12} {'req/s':>7} {'p50 s':>7} {'p95 s':>7}")
+    for name, fn in (("in-process", in_process), ("server", client.summarize)):
+        rps, p50, p95 = run_clients(args.clients, texts, fn)
+        print(f"{name:<12} {rps:7.2f} {p50:7.2f} {p95:7.2f}")
+    st = client.stats()
+    print(f"server: {st['items']} inputs in {st['batches']} forward passes "
+          f"({st['items'] / max(1, st['batches']):.1f} per pass), {st['refused']} refused")
+
+
+if __name__ == "__main__":
+    main()
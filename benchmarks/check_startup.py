@@ -0,0 +1,55 @@
+"""Startup budget check: fails (exit 1) if importing app.py / create_app()
+takes longer than the budget, or if it pulls in a heavy ML stack eagerly.
+
+Each run is a fresh interpreter, so nothing is pre-imported. Run from the
+project root:
+
+    python -m benchmarks.check_startup --budget 2.0
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+HEAVY_MODULES = ("torch", "transformers", "google.generativeai", "pytesseract", "pdf2image")
+
+_PROBE = """
+import json, sys, time
+t0 = time.perf_counter()
+import app
+dt = time.perf_counter() - t0
+print(json.dumps({"seconds": dt, "loaded": [m for m in %r if m in sys.modules]}))
+""" % (HEAVY_MODULES,)
+
+
+def measure() -> dict:
+    out = subprocess.run([sys.executable, "-c", _PROBE], capture_output=True, text=True,
+                         check=True, cwd=os.getcwd())
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--budget", type=float, default=float(os.getenv("STARTUP_BUDGET", "2.0")))
+    ap.add_argument("--runs", type=int, default=3)
+    args = ap.parse_args()
+
+    results = [measure() for _ in range(args.runs)]
+    best = min(r["seconds"] for r in results)
+    loaded = sorted({m for r in results for m in r["loaded"]})
+    print(f"create_app(): best of {args.runs} = {best:.3f}s (budget {args.budget:.2f}s)")
+    print(f"heavy modules imported at startup: {loaded or 'none'}")
+
+    failed = False
+    if best > args.budget:
+        print("FAIL: startup exceeds budget")
+        failed = True
+    if loaded:
+        print("FAIL: heavy modules must load lazily")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -7,5 +7,11 @@ SECRET_KEY = os.getenv("SECRET_KEY")
 FLASK_ENV = os.getenv("FLASK_ENV")
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
+# Usernames allowed to see operational endpoints such as /rag/cache_stats
+ADMIN_USERS = {u.strip() for u in os.getenv("ADMIN_USERS", "").split(",") if u.strip()}
+
+# Load BART / OCR / Gemini in a background thread at startup instead of on first use
+WARMUP_MODELS = os.getenv("WARMUP_MODELS", "0") == "1"
+
 SQLALCHEMY_DATABASE_URI = 'sqlite:///users.db'
 SQLALCHEMY_TRACK_MODIFICATIONS = False
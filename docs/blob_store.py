@@ -0,0 +1,137 @@
+import os
+import uuid
+import shutil
+import hashlib
+from sqlalchemy.exc import IntegrityError
+from models import db, ContentBlob, DocumentBlob
+
+# instance/blobs/<sha256>/ holds the source file and its FAISS index + chunks
+BLOB_DIR = os.path.join("instance", "blobs")
+
+_READ_CHUNK = 1024 * 1024
+
+
+def blob_dir(sha: str) -> str:
+    return os.path.join(os.path.abspath(BLOB_DIR), sha)
+
+
+def source_path(sha: str, filename: str) -> str:
+    ext = os.path.splitext(filename)[1].lower()
+    return os.path.join(blob_dir(sha), f"source{ext}")
+
+
+def existing_source(sha: str):
+    """Path of the blob's stored source file, whatever extension it came with."""
+    try:
+        names = [n for n in os.listdir(blob_dir(sha)) if n.startswith("source")]
+    except OSError:
+        return None
+    return os.path.join(blob_dir(sha), names[0]) if names else None
+
+
+def save_and_hash(file_storage, tmp_dir: str):
+    """Stream an upload to a temp file, hashing it on the way. -> (sha256, tmp_path)"""
+    os.makedirs(tmp_dir, exist_ok=True)
+    tmp_path = os.path.join(tmp_dir, f".upload-{uuid.uuid4().hex}")
+    h = hashlib.sha256()
+    with open(tmp_path, "wb") as out:
+        while True:
+            block = file_storage.stream.read(_READ_CHUNK)
+            if not block:
+                break
+            h.update(block)
+            out.write(block)
+    return h.hexdigest(), tmp_path
+
+
+def blob_for_doc(doc_id: int):
+    """sha256 of the blob behind a document, or None for pre-dedup documents."""
+    link = db.session.get(DocumentBlob, doc_id)
+    return link.sha256 if link else None
+
+
+def acquire(sha: str, doc_id: int, tmp_path: str, filename: str) -> ContentBlob:
+    """Link `doc_id` to blob `sha`, creating the blob from `tmp_path` if new.
+
+    The refcount is bumped with an UPDATE ... SET refcount = refcount + 1 so
+    concurrent duplicate uploads never lose a reference.
+    """
+    while True:
+        bumped = ContentBlob.query.filter_by(sha256=sha).update(
+            {"refcount": ContentBlob.refcount + 1}, synchronize_session=False)
+        if bumped:
+            break
+        try:
+            db.session.add(ContentBlob(sha256=sha, refcount=1, status="pending"))
+            db.session.commit()
+            break
+        except IntegrityError:
+            db.session.rollback()   # created concurrently; bump it on the next pass
+    db.session.add(DocumentBlob(document_id=doc_id, sha256=sha))
+    db.session.commit()
+
+    if existing_source(sha):
+        os.remove(tmp_path)
+    else:
+        dest = source_path(sha, filename)
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        shutil.move(tmp_path, dest)
+    return db.session.get(ContentBlob, sha)
+
+
+def claim(sha: str) -> bool:
+    """Mark blob `sha` pending for a new ingest job. -> False if it is ready
+    or another job is already ingesting it.
+
+    One conditional UPDATE decides. The caller adds its IngestJob and commits
+    in the same transaction, so two uploads of new content never both start a job.
+    """
+    from models import IngestJob
+    active = (db.session.query(IngestJob.id)
+              .join(DocumentBlob, DocumentBlob.document_id == IngestJob.document_id)
+              .filter(DocumentBlob.sha256 == sha, IngestJob.status.in_(("queued", "running")))
+              .exists())
+    won = (ContentBlob.query
+           .filter(ContentBlob.sha256 == sha, ContentBlob.status != "ready", ~active)
+           .update({"status": "pending"}, synchronize_session=False))
+    if not won:
+        db.session.rollback()
+    return bool(won)
+
+
+def mark_ready(sha: str, text: str):
+    """Store the extracted text on the blob and hand it to every document sharing it."""
+    from models import Document
+    blob = db.session.get(ContentBlob, sha)
+    blob.extracted_text = text
+    blob.status = "ready"
+    doc_ids = [l.document_id for l in DocumentBlob.query.filter_by(sha256=sha)]
+    if doc_ids:
+        Document.query.filter(Document.id.in_(doc_ids), Document.extracted_text.is_(None)).update(
+            {"extracted_text": text}, synchronize_session=False)
+    db.session.commit()
+
+
+def release(doc_id: int) -> bool:
+    """Drop a document's reference; delete the blob with its last reference.
+
+    Returns True if the document was blob-backed (caller then has nothing
+    else on disk to remove for it).
+    """
+    link = db.session.get(DocumentBlob, doc_id)
+    if link is None:
+        return False
+    sha = link.sha256
+    db.session.delete(link)
+    ContentBlob.query.filter_by(sha256=sha).update(
+        {"refcount": ContentBlob.refcount - 1}, synchronize_session=False)
+    db.session.commit()
+
+    gone = ContentBlob.query.filter(ContentBlob.sha256 == sha, ContentBlob.refcount <= 0).delete(
+        synchronize_session=False)
+    db.session.commit()
+    if gone:
+        from docs.index_store import forget_key
+        forget_key(sha)
+        shutil.rmtree(blob_dir(sha), ignore_errors=True)
+    return True
@@ -0,0 +1,99 @@
+import os
+import mmap
+import uuid
+import struct
+import numpy as np
+
+# <utf-8 chunk bytes><uint64 offsets x (n+1)><MAGIC><uint64 n>
+# The table sits in a footer so a writer can stream chunks without knowing n.
+MAGIC = b"CHNKS01\0"
+_FOOTER = struct.Struct("<8sQ")
+
+
+class ChunkWriter:
+    """Append chunks one at a time; close() writes the offset table and
+    atomically moves the file into place (readers mapping an older file
+    keep their inode)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._tmp = f"{path}.tmp-{uuid.uuid4().hex}"   # unique per writer, even within a process
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._fh = open(self._tmp, "wb")
+        self._offsets = [0]
+
+    def append(self, text: str):
+        data = text.encode("utf-8")
+        self._fh.write(data)
+        self._offsets.append(self._offsets[-1] + len(data))
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def close(self):
+        self._fh.write(np.asarray(self._offsets, dtype="<u8").tobytes())
+        self._fh.write(_FOOTER.pack(MAGIC, len(self)))
+        self._fh.flush()
+        os.fsync(self._fh.fileno())
+        self._fh.close()
+        os.replace(self._tmp, self.path)
+
+    def abort(self):
+        self._fh.close()
+        if os.path.exists(self._tmp):
+            os.remove(self._tmp)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *_):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def write_chunks(path: str, chunks):
+    with ChunkWriter(path) as w:
+        for c in chunks:
+            w.append(c)
+
+
+class ChunkStore:
+    """Read-only, mmap-backed sequence of chunk strings.
+
+    Opening touches only the footer; chunk i is decoded from its own byte
+    range, and pages are shared through the page cache between processes.
+    """
+
+    def __init__(self, path: str):
+        with open(path, "rb") as fh:
+            size = os.fstat(fh.fileno()).st_size
+            if size < _FOOTER.size:
+                raise ValueError(f"{path}: not a chunk store")
+            self._mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, n = _FOOTER.unpack_from(self._mm, size - _FOOTER.size)
+        if magic != MAGIC:
+            raise ValueError(f"{path}: not a chunk store")
+        table_at = size - _FOOTER.size - 8 * (n + 1)
+        self._offsets = np.frombuffer(self._mm, dtype="<u8", count=n + 1, offset=table_at)
+        self._n = n
+
+    def __len__(self):
+        return self._n
+
+    def raw(self, i: int) -> memoryview:
+        """Zero-copy view of chunk i's UTF-8 bytes."""
+        if not -self._n <= i < self._n:
+            raise IndexError(i)
+        i %= self._n
+        return memoryview(self._mm)[int(self._offsets[i]):int(self._offsets[i + 1])]
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(self._n))]
+        return str(self.raw(i), "utf-8")
+
+    def __iter__(self):
+        for i in range(self._n):
+            yield self[i]
@@ -0,0 +1,116 @@
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import llm
+from llm import EMB_MODEL
+
+# ------------------- Batching knobs -------------------
+# Gemini's batchEmbedContents accepts at most 100 texts per call.
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+EMBED_WORKERS = int(os.getenv("EMBED_WORKERS", "4"))
+EMBED_RETRIES = int(os.getenv("EMBED_RETRIES", "3"))
+EMBED_RETRY_BACKOFF = float(os.getenv("EMBED_RETRY_BACKOFF", "0.5"))
+# embed_stream(): batches submitted but not yet consumed (bounds memory)
+EMBED_INFLIGHT = int(os.getenv("EMBED_INFLIGHT", "8"))
+
+
+def normalize_rows(X: np.ndarray) -> np.ndarray:
+    """L2-normalize every row so inner product == cosine similarity."""
+    X = np.asarray(X, dtype=np.float32)
+    n = np.linalg.norm(X, axis=1, keepdims=True) + 1e-12
+    return X / n
+
+
+def provider_embed_batch(texts: list[str]) -> np.ndarray:
+    """One round-trip to the embedding provider for a whole batch of texts.
+    Failed batches are retried by embed_stream, so not again in here."""
+    return llm.embed(texts, EMB_MODEL, retries=0)
+
+
+def _embed_with_retry(embed_batch, batch, retries, backoff):
+    for attempt in range(retries + 1):
+        try:
+            X = np.asarray(embed_batch(batch), dtype=np.float32)
+            if X.ndim != 2 or X.shape[0] != len(batch):
+                raise ValueError(f"embedder returned shape {X.shape} for {len(batch)} texts")
+            return X
+        except Exception as e:
+            if attempt == retries:
+                raise
+            print(f"EMBED RETRY {attempt + 1}/{retries}:", e)
+            time.sleep(backoff * (2 ** attempt))
+
+
+def _embed_one_batch(batch, embed_batch, retries, store, model):
+    """-> (normalized X, reused, embedded, api_calls) for one batch."""
+    if store is None:
+        return normalize_rows(_embed_with_retry(embed_batch, batch, retries, EMBED_RETRY_BACKOFF)), 0, len(batch), 1
+    from docs.embedding_store import chunk_key
+    keys = [chunk_key(c, model) for c in batch]
+    vecs = store.get_many(keys)
+    missing = {}
+    for k, c in zip(keys, batch):
+        if k not in vecs and k not in missing:
+            missing[k] = c
+    if missing:
+        X_new = normalize_rows(_embed_with_retry(embed_batch, list(missing.values()), retries, EMBED_RETRY_BACKOFF))
+        store.put_many(list(missing), X_new)
+        vecs.update(zip(missing, X_new))
+    reused = sum(1 for k in keys if k not in missing)
+    return np.vstack([vecs[k] for k in keys]).astype(np.float32), reused, len(missing), int(bool(missing))
+
+
+def embed_stream(chunks, embed_batch=None, batch_size: int = None, workers: int = None,
+                 retries: int = None, inflight: int = None, store=None, model: str = EMB_MODEL,
+                 stats: dict = None):
+    """Embed `chunks` (any iterable, e.g. a generator) in batches on a
+    bounded thread pool.
+
+    Yields (batch_chunks, X) in input order, X normalized; a failing batch
+    is retried on its own. At most `inflight` batches are submitted ahead
+    of the consumer, so memory stays bounded however long the input is.
+
+    With an EmbeddingStore as `store`, vectors already stored for
+    (chunk text, `model`) are reused and only the missing chunks of a batch
+    are sent. `stats`, if given, is filled with chunks / reused / embedded /
+    api_calls / api_calls_saved counts.
+    """
+    embed_batch = embed_batch or provider_embed_batch
+    batch_size = max(1, batch_size or EMBED_BATCH_SIZE)
+    workers = max(1, workers or EMBED_WORKERS)
+    retries = EMBED_RETRIES if retries is None else retries
+    inflight = max(workers, inflight or EMBED_INFLIGHT)
+    if stats is not None:
+        stats.update(chunks=0, reused=0, embedded=0, api_calls=0, api_calls_saved=0)
+
+    def batches():
+        batch = []
+        for c in chunks:
+            batch.append(c)
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        def drain_one():
+            batch, fut = pending.popleft()
+            X, reused, embedded, calls = fut.result()
+            if stats is not None:
+                stats["chunks"] += len(batch)
+                stats["reused"] += reused
+                stats["embedded"] += embedded
+                stats["api_calls"] += calls
+                stats["api_calls_saved"] += 1 - calls
+            return batch, X
+
+        for batch in batches():
+            pending.append((batch, ex.submit(_embed_one_batch, batch, embed_batch, retries, store, model)))
+            if len(pending) >= inflight:
+                yield drain_one()
+        while pending:
+            yield drain_one()
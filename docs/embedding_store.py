@@ -0,0 +1,148 @@
+import os
+import sqlite3
+import hashlib
+import threading
+import numpy as np
+
+EMB_STORE_DIR = os.path.join("instance", "embeddings")
+# float32 = exact; int8 = 4x smaller (components of unit vectors scaled by 127)
+EMB_STORE_DTYPE = os.getenv("EMB_STORE_DTYPE", "float32").lower()
+
+_SQL_BATCH = 500   # keys per "IN (...)" lookup
+
+
+def chunk_key(text: str, model: str) -> str:
+    return hashlib.sha256(f"{model}\x00{text}".encode("utf-8")).hexdigest()[:32]
+
+
+class EmbeddingStore:
+    """Append-only vector file + SQLite offset index, shared across documents.
+
+    vectors-<dtype>-<dim>.bin holds fixed-size rows and is read through a
+    memmap; index-<dtype>.sqlite maps chunk key -> row. Each dtype is a
+    separate store, so switching EMB_STORE_DTYPE starts an empty one instead
+    of reading another dtype's row numbers. Appends run inside a SQLite
+    write transaction, which also serializes writers across processes.
+    """
+
+    def __init__(self, root: str, dtype: str = "float32"):
+        if dtype not in ("float32", "int8"):
+            raise ValueError(f"EMB_STORE_DTYPE must be float32 or int8, got {dtype!r}")
+        self.root = os.path.abspath(root)
+        self.dtype = np.dtype(dtype)
+        self._local = threading.local()
+        self._mmaps = {}           # dim -> (rows, memmap)
+        self._lock = threading.Lock()
+
+    # ---------- files ----------
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(self.root, exist_ok=True)
+            conn = sqlite3.connect(os.path.join(self.root, f"index-{self.dtype.name}.sqlite"), timeout=30,
+                                   isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS vectors (key TEXT PRIMARY KEY, dim INTEGER, row INTEGER)")
+            conn.execute("CREATE TABLE IF NOT EXISTS files (dim INTEGER PRIMARY KEY, n_rows INTEGER)")
+            self._local.conn = conn
+        return conn
+
+    def _path(self, dim: int) -> str:
+        return os.path.join(self.root, f"vectors-{self.dtype.name}-{dim}.bin")
+
+    def _rows_view(self, dim: int, need_rows: int):
+        """Memmap covering at least `need_rows` rows (re-mapped as the file grows)."""
+        with self._lock:
+            rows, mm = self._mmaps.get(dim, (0, None))
+            if rows < need_rows:
+                size_rows = os.path.getsize(self._path(dim)) // (dim * self.dtype.itemsize)
+                mm = np.memmap(self._path(dim), dtype=self.dtype, mode="r", shape=(size_rows, dim))
+                rows = size_rows
+                self._mmaps[dim] = (rows, mm)
+            return mm
+
+    def _encode(self, X: np.ndarray) -> np.ndarray:
+        if self.dtype == np.int8:
+            return np.clip(np.rint(X * 127.0), -127, 127).astype(np.int8)
+        return X.astype(np.float32)
+
+    def _decode(self, R: np.ndarray) -> np.ndarray:
+        if self.dtype == np.int8:
+            X = R.astype(np.float32) / 127.0
+            return X / (np.linalg.norm(X, axis=1, keepdims=True) + 1e-12)
+        return np.asarray(R, dtype=np.float32)
+
+    # ---------- public API ----------
+    def get_many(self, keys: list[str]) -> dict:
+        """Bulk lookup -> {key: vector} for the keys that are stored."""
+        conn = self._conn()
+        found = {}
+        uniq = list(dict.fromkeys(keys))
+        for i in range(0, len(uniq), _SQL_BATCH):
+            part = uniq[i:i + _SQL_BATCH]
+            q = f"SELECT key, dim, row FROM vectors WHERE key IN ({','.join('?' * len(part))})"
+            for key, dim, row in conn.execute(q, part):
+                found[key] = (dim, row)
+        out = {}
+        by_dim = {}
+        for key, (dim, row) in found.items():
+            by_dim.setdefault(dim, []).append((key, row))
+        for dim, items in by_dim.items():
+            rows = np.fromiter((r for _, r in items), dtype=np.int64, count=len(items))
+            mm = self._rows_view(dim, int(rows.max()) + 1)
+            X = self._decode(mm[rows])
+            for (key, _), v in zip(items, X):
+                out[key] = v
+        return out
+
+    def put_many(self, keys: list[str], X: np.ndarray):
+        """Append vectors for keys not stored yet (rows of X line up with keys)."""
+        if not len(keys):
+            return
+        X = np.asarray(X, dtype=np.float32)
+        dim = X.shape[1]
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            fresh, seen = [], set()
+            existing = set()
+            for i in range(0, len(keys), _SQL_BATCH):
+                part = keys[i:i + _SQL_BATCH]
+                q = f"SELECT key FROM vectors WHERE key IN ({','.join('?' * len(part))})"
+                existing.update(k for (k,) in conn.execute(q, part))
+            for i, k in enumerate(keys):
+                if k not in existing and k not in seen:
+                    seen.add(k)
+                    fresh.append(i)
+            if not fresh:
+                conn.execute("COMMIT")
+                return
+            row = conn.execute("SELECT n_rows FROM files WHERE dim = ?", (dim,)).fetchone()
+            n_rows = row[0] if row else 0
+
+            data = self._encode(X[fresh]).tobytes()
+            path = self._path(dim)
+            with open(path, "r+b" if os.path.exists(path) else "wb") as fh:
+                # rows past n_rows are leftovers of an uncommitted append; overwrite them
+                fh.seek(n_rows * dim * self.dtype.itemsize)
+                fh.write(data)
+                fh.truncate()
+
+            conn.executemany("INSERT INTO vectors (key, dim, row) VALUES (?, ?, ?)",
+                             [(keys[i], dim, n_rows + j) for j, i in enumerate(fresh)])
+            conn.execute("INSERT OR REPLACE INTO files (dim, n_rows) VALUES (?, ?)",
+                         (dim, n_rows + len(fresh)))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def stats(self) -> dict:
+        conn = self._conn()
+        n = conn.execute("SELECT COUNT(*) FROM vectors").fetchone()[0]
+        size = sum(os.path.getsize(os.path.join(self.root, f)) for f in os.listdir(self.root)
+                   if f"-{self.dtype.name}" in f)
+        return {"vectors": n, "bytes_on_disk": size, "dtype": self.dtype.name}
+
+
+EMBEDDING_STORE = EmbeddingStore(EMB_STORE_DIR, EMB_STORE_DTYPE)
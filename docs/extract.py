@@ -0,0 +1,118 @@
+import os
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from pypdf import PdfReader
+import docx
+
+# Tesseract / Poppler paths (pdf2image + pytesseract are imported on first OCR)
+TESSERACT_CMD = r"C:\\Program Files\\Tesseract-OCR\\tesseract.exe"
+POPPLER_BIN = r"C:\poppler-25.07.0\Library\bin"
+
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", str(max(1, (os.cpu_count() or 2) - 1))))
+# pages rasterized/OCR'd at once; bounds memory to a few page images
+OCR_MAX_IN_FLIGHT = int(os.getenv("OCR_MAX_IN_FLIGHT", str(OCR_WORKERS * 2)))
+OCR_DPI = int(os.getenv("OCR_DPI", "200"))
+# a page whose text layer has fewer characters than this is OCR'd
+OCR_MIN_PAGE_CHARS = int(os.getenv("OCR_MIN_PAGE_CHARS", "20"))
+
+_ocr_lock = threading.Lock()
+_ocr_stack = None
+_pool_lock = threading.Lock()
+_pool = None
+
+
+def load_ocr_stack():
+    """(convert_from_path, pytesseract), imported on first use."""
+    global _ocr_stack
+    if _ocr_stack is None:
+        with _ocr_lock:
+            if _ocr_stack is None:
+                from pdf2image import convert_from_path
+                import pytesseract
+                pytesseract.pytesseract.tesseract_cmd = TESSERACT_CMD
+                _ocr_stack = (convert_from_path, pytesseract)
+    return _ocr_stack
+
+
+def _ocr_page(save_path: str, page_no: int) -> str:
+    """Rasterize and OCR a single page (1-based). Runs in a pool process."""
+    convert_from_path, pytesseract = load_ocr_stack()
+    images = convert_from_path(save_path, dpi=OCR_DPI, first_page=page_no, last_page=page_no,
+                               poppler_path=POPPLER_BIN)
+    return "".join(pytesseract.image_to_string(img) for img in images)
+
+
+def _ocr_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                # spawn: ingestion runs on threads, and forking a threaded process is unsafe
+                _pool = ProcessPoolExecutor(max_workers=OCR_WORKERS,
+                                            mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def _iter_page_texts(save_path: str):
+    """Yield (page_no, text_layer) for every page; "" where there is none."""
+    try:
+        reader = PdfReader(save_path)
+        n_pages = len(reader.pages)
+    except Exception:
+        reader = None
+        from pdf2image import pdfinfo_from_path
+        n_pages = int(pdfinfo_from_path(save_path, poppler_path=POPPLER_BIN)["Pages"])
+    for i in range(n_pages):
+        text = ""
+        if reader is not None:
+            try:
+                text = reader.pages[i].extract_text() or ""
+            except Exception:
+                text = ""
+        yield i + 1, text
+
+
+def extract_pdf_text(save_path: str) -> str:
+    """Per-page extraction: text layer where there is one, OCR where there isn't.
+
+    Pages are read one at a time; pages needing OCR are handed to a process
+    pool with at most OCR_MAX_IN_FLIGHT outstanding, so a 200-page scan never
+    has more than a handful of rasterized pages in memory. Output is
+    assembled in page order with a single join.
+    """
+    parts = []
+    pending = {}   # future -> index into parts
+    for page_no, text in _iter_page_texts(save_path):
+        parts.append(text)
+        if len(text.strip()) >= OCR_MIN_PAGE_CHARS:
+            continue
+        if len(pending) >= OCR_MAX_IN_FLIGHT:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                _collect(parts, pending.pop(fut), fut)
+        pending[_ocr_pool().submit(_ocr_page, save_path, page_no)] = len(parts) - 1
+    for fut, idx in pending.items():
+        _collect(parts, idx, fut)
+    return "".join(parts)
+
+
+def _collect(parts, idx, fut):
+    try:
+        ocr = fut.result()
+    except Exception as e:
+        print("OCR ERROR: page", idx + 1, e)
+        return
+    if len(ocr.strip()) > len(parts[idx].strip()):
+        parts[idx] = ocr
+
+
+def extract_text_from_file(save_path: str, filename: str) -> str:
+    if filename.lower().endswith(".pdf"):
+        return extract_pdf_text(save_path)
+    if filename.lower().endswith(".docx"):
+        d = docx.Document(save_path)
+        return "".join(para.text + "\n" for para in d.paragraphs)
+    with open(save_path, "rb") as fh:
+        raw = fh.read()
+    return raw.decode("utf-8", errors="ignore")
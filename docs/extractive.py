@@ -0,0 +1,73 @@
+"""Extractive summaries: pick representative, non-redundant sentences.
+
+Sentences are TF-IDF vectors; relevance is similarity to the document
+centroid. Candidates are taken in relevance order and a sentence is skipped
+when it repeats one of the last EXTRACTIVE_WINDOW picks. Comparing against a
+fixed window instead of every pick keeps the whole thing O(n log n) in the
+number of sentences (the sort), so 100k-word documents take well under a
+second. No model, no network.
+"""
+import os
+import re
+import numpy as np
+
+EXTRACTIVE_WINDOW = int(os.getenv("EXTRACTIVE_WINDOW", "16"))
+EXTRACTIVE_REDUNDANCY = float(os.getenv("EXTRACTIVE_REDUNDANCY", "0.5"))   # max cosine to a recent pick
+EXTRACTIVE_MAX_SENTENCE_WORDS = 60   # OCR text often lacks punctuation; cut run-ons
+
+_SENT_SPLIT = re.compile(r"(?<=[.!?])\s+")
+
+
+def split_sentences(text: str) -> list[str]:
+    out = []
+    for sent in _SENT_SPLIT.split(text):
+        words = sent.split()
+        for i in range(0, len(words), EXTRACTIVE_MAX_SENTENCE_WORDS):
+            out.append(" ".join(words[i:i + EXTRACTIVE_MAX_SENTENCE_WORDS]))
+    return out
+
+
+def extractive_summarize(text: str, target_words: int) -> str:
+    """About `target_words` words of the document's own sentences, in
+    document order."""
+    from sklearn.feature_extraction.text import TfidfVectorizer
+
+    sentences = split_sentences(text)
+    lengths = np.array([len(s.split()) for s in sentences])
+    if lengths.sum() <= target_words:
+        return " ".join(sentences)
+
+    try:
+        X = TfidfVectorizer(sublinear_tf=True, stop_words="english").fit_transform(sentences)   # rows L2-normalized
+    except ValueError:
+        X = None   # nothing but stop words
+    if X is None or X.shape[1] == 0:
+        return " ".join(text.split()[:target_words])
+
+    centroid = np.asarray(X.mean(axis=0)).ravel()
+    centroid /= np.linalg.norm(centroid) + 1e-12
+    relevance = X @ centroid
+    # a few words of context are not worth a slot of their own
+    relevance[lengths < 4] = -1.0
+
+    # the last EXTRACTIVE_WINDOW picks as dense rows (a ring buffer), so the
+    # redundancy check is a gather + tiny mat-vec instead of sparse products
+    X = X.tocsr()
+    window = np.zeros((EXTRACTIVE_WINDOW, X.shape[1]), dtype=np.float32)
+    picked, spent = [], 0
+    smallest = max(1, int(lengths.min()))
+    for i in np.argsort(-relevance, kind="stable"):
+        if target_words - spent < smallest:
+            break
+        if relevance[i] <= 0 or spent + lengths[i] > target_words:
+            continue
+        cols = X.indices[X.indptr[i]:X.indptr[i + 1]]
+        vals = X.data[X.indptr[i]:X.indptr[i + 1]]
+        if picked and (window[:, cols] @ vals).max() > EXTRACTIVE_REDUNDANCY:
+            continue
+        slot = window[len(picked) % EXTRACTIVE_WINDOW]
+        slot[:] = 0
+        slot[cols] = vals
+        picked.append(i)
+        spent += lengths[i]
+    return " ".join(sentences[i] for i in sorted(picked))
@@ -0,0 +1,122 @@
+import os
+import math
+import numpy as np
+import faiss
+
+# flat = exact float32 (3 KB/vector at 768-d); sq8 = 1 byte/dim (4x smaller);
+# pq = INDEX_PQ_M bytes/vector (32x smaller at M=96)
+INDEX_KIND = os.getenv("INDEX_KIND", "flat").lower()
+INDEX_PQ_M = int(os.getenv("INDEX_PQ_M", "96"))
+# PQ needs ~39 training vectors per centroid; smaller sets use fewer bits, then SQ8
+PQ_MIN_TRAIN = int(os.getenv("INDEX_PQ_MIN_TRAIN", "624"))
+# re-score a k * factor shortlist with the exact vectors from the embedding store
+INDEX_RESCORE = os.getenv("INDEX_RESCORE", "1") == "1"
+INDEX_RESCORE_FACTOR = int(os.getenv("INDEX_RESCORE_FACTOR", "4"))
+
+INDEX_KINDS = ("flat", "sq8", "pq")
+# IndexBuilder trains quantized kinds on the first this-many vectors; 10000
+# is past the point where code_string() stops growing PQ codes
+INDEX_TRAIN_SAMPLE = int(os.getenv("INDEX_TRAIN_SAMPLE", "10000"))
+
+
+def code_string(kind: str, n: int, d: int) -> str:
+    """faiss factory suffix for `kind` over n training vectors of dim d."""
+    if kind not in INDEX_KINDS:
+        raise ValueError(f"INDEX_KIND must be one of {INDEX_KINDS}, got {kind!r}")
+    if kind == "flat":
+        return "Flat"
+    if kind == "pq" and n >= PQ_MIN_TRAIN and d % INDEX_PQ_M == 0:
+        nbits = max(4, min(8, int(math.log2(n / 39))))
+        return f"PQ{INDEX_PQ_M}x{nbits}"
+    return "SQ8"
+
+
+def make_index(X: np.ndarray, kind: str = None):
+    """Trained index of the configured kind holding X (rows = chunk order)."""
+    X = np.ascontiguousarray(X, dtype=np.float32)
+    index = faiss.index_factory(X.shape[1], code_string(kind or INDEX_KIND, *X.shape),
+                                faiss.METRIC_INNER_PRODUCT)
+    if isinstance(index, faiss.IndexPQ):
+        index.do_polysemous_training = False   # only helps Hamming search, costs seconds
+    if not index.is_trained:
+        index.train(X)
+    index.add(X)
+    return index
+
+
+class IndexBuilder:
+    """make_index() for vectors that arrive in batches.
+
+    Flat indexes take every batch as it comes. Quantized kinds buffer the
+    first INDEX_TRAIN_SAMPLE vectors, train on them, then add the rest
+    directly, so at most one training sample is ever held in memory.
+    """
+
+    def __init__(self, kind: str = None, train_size: int = None, expected: int = None):
+        self.kind = kind or INDEX_KIND
+        self.train_size = train_size or INDEX_TRAIN_SAMPLE
+        self.expected = expected   # vector count, if known: storage is sized once
+        self.index = None
+        self._buffer = []
+        self._buffered = 0
+
+    def add(self, X: np.ndarray):
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if self.index is not None:
+            self.index.add(X)
+        elif self.kind == "flat":
+            self.index = faiss.index_factory(X.shape[1], "Flat", faiss.METRIC_INNER_PRODUCT)
+            self._reserve()
+            self.index.add(X)
+        else:
+            self._buffer.append(X)
+            self._buffered += X.shape[0]
+            if self._buffered >= self.train_size:
+                self._train()
+
+    def _train(self):
+        self.index = make_index(np.vstack(self._buffer), self.kind)
+        self._buffer, self._buffered = [], 0
+        self._reserve()
+
+    def _reserve(self):
+        # growing by add() doubles the code vector, briefly holding ~3x the
+        # index; std::vector keeps its capacity when shrunk, so grow it once
+        codes = getattr(self.index, "codes", None)
+        if self.expected and isinstance(codes, faiss.UInt8Vector):
+            used = codes.size()
+            codes.resize(max(used, self.expected * self.index.code_size))
+            codes.resize(used)
+
+    @property
+    def ntotal(self) -> int:
+        return (self.index.ntotal if self.index is not None else 0) + self._buffered
+
+    def finish(self):
+        """-> the index, or None if nothing was added."""
+        if self.index is None and self._buffer:
+            self._train()
+        return self.index
+
+
+def shortlist_size(top_k: int, exact: bool) -> int:
+    return top_k if exact or not INDEX_RESCORE else top_k * INDEX_RESCORE_FACTOR
+
+
+def rescore(qv: np.ndarray, hits: list, texts: list, top_k: int):
+    """Re-rank approximate `hits` (tuples starting with the score) by exact
+    cosine against stored chunk vectors; hits without one keep their score.
+    -> (hits, texts) trimmed to top_k, best first."""
+    from docs.embedding import EMB_MODEL
+    from docs.embedding_store import EMBEDDING_STORE, chunk_key
+    keys = [chunk_key(t, EMB_MODEL) for t in texts]
+    vecs = EMBEDDING_STORE.get_many(keys)
+    qv = np.asarray(qv, dtype=np.float32).ravel()
+    scored = []
+    for hit, text, key in zip(hits, texts, keys):
+        v = vecs.get(key)
+        score = float(v @ qv) if v is not None and v.shape[0] == qv.shape[0] else hit[0]
+        scored.append(((score, *hit[1:]), text))
+    scored.sort(key=lambda p: -p[0][0])
+    scored = scored[:top_k]
+    return [h for h, _ in scored], [t for _, t in scored]
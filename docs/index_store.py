@@ -0,0 +1,247 @@
+import os
+import sys
+import json
+import uuid
+import threading
+from collections import OrderedDict
+import faiss
+
+from docs.chunk_store import ChunkStore, ChunkWriter
+
+INDEX_DIR = os.path.join("instance", "indexes")
+
+# Process-wide budget for loaded indexes + chunk lists (bytes, not entries)
+INDEX_CACHE_MAX_BYTES = int(os.getenv("INDEX_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+# mmap the index where this faiss build can (IO_FLAG_MMAP_IFC maps flat codes
+# zero-copy on faiss >= 1.10; older builds only map IVF lists)
+FAISS_READ_FLAGS = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+
+
+def index_key(doc_id: int):
+    """Storage key of a document's index: its blob sha256 when the upload is
+    content-addressed (shared by identical uploads), else the doc id itself.
+    """
+    from docs.blob_store import blob_for_doc
+    return blob_for_doc(doc_id) or doc_id
+
+
+def _key_paths(key):
+    """-> (faiss path, chunk store path, legacy JSON meta path)"""
+    if isinstance(key, str):
+        from docs.blob_store import blob_dir
+        base = blob_dir(key)
+        return (os.path.join(base, "index.faiss"), os.path.join(base, "index.chunks"),
+                os.path.join(base, "index.meta.json"))
+    base = os.path.abspath(INDEX_DIR)
+    return (os.path.join(base, f"{key}.faiss"), os.path.join(base, f"{key}.chunks"),
+            os.path.join(base, f"{key}.meta.json"))
+
+
+def index_paths(doc_id: int):
+    return _key_paths(index_key(doc_id))
+
+
+def key_version(key):
+    """Stamp of the on-disk index; changes whenever it is rewritten or removed.
+
+    Lets caches in *other* worker processes notice a re-index they were not
+    told about (and a reused doc id after a delete).
+    """
+    try:
+        st = os.stat(_key_paths(key)[0])
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+# Callbacks run with the storage key whenever an index is rewritten or removed
+_CHANGE_HOOKS = []
+
+
+def on_index_change(fn):
+    _CHANGE_HOOKS.append(fn)
+    return fn
+
+
+def _notify_change(key):
+    INDEX_CACHE.invalidate(key)
+    for fn in _CHANGE_HOOKS:
+        fn(key)
+
+
+def _entry_bytes(faiss_path: str, meta: dict) -> int:
+    # the on-disk faiss file is a close proxy for its in-memory size;
+    # mmapped chunk stores live in the page cache, JSON chunk lists on the heap
+    size = os.path.getsize(faiss_path)
+    chunks = meta.get("chunks", [])
+    if not isinstance(chunks, ChunkStore):
+        size += sum(sys.getsizeof(c) for c in chunks)
+    return size
+
+
+def read_chunks(chunks_path: str, legacy_meta_path: str):
+    """Chunk sequence of an index: the mmapped store, or a not yet migrated
+    JSON list. None if neither exists."""
+    if os.path.exists(chunks_path):
+        return ChunkStore(chunks_path)
+    if os.path.exists(legacy_meta_path):
+        with open(legacy_meta_path, "r", encoding="utf-8") as f:
+            return json.load(f).get("chunks", [])
+    return None
+
+
+class IndexCache:
+    """Thread-safe LRU of (faiss index, meta) keyed by storage key, bounded by bytes."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()   # key -> (index, meta, nbytes, version)
+        self._bytes = 0
+        self._generations = {}          # key -> bumped on every invalidate
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def generation(self, doc_id) -> int:
+        with self._lock:
+            return self._generations.get(doc_id, 0)
+
+    def get(self, doc_id, version=None):
+        with self._lock:
+            entry = self._entries.get(doc_id)
+            if entry is not None and entry[3] != version:
+                del self._entries[doc_id]
+                self._bytes -= entry[2]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(doc_id)
+            self.hits += 1
+            return entry[0], entry[1]
+
+    def put(self, doc_id, index, meta, nbytes: int, version=None, generation: int = 0):
+        if nbytes > self.max_bytes:
+            return  # would evict everything else for a single entry
+        with self._lock:
+            if self._generations.get(doc_id, 0) != generation:
+                return  # files changed while this copy was being loaded
+            old = self._entries.pop(doc_id, None)
+            if old is not None:
+                self._bytes -= old[2]
+            self._entries[doc_id] = (index, meta, nbytes, version)
+            self._bytes += nbytes
+            while self._bytes > self.max_bytes and self._entries:
+                _, (_, _, freed, _) = self._entries.popitem(last=False)
+                self._bytes -= freed
+                self.evictions += 1
+
+    def invalidate(self, doc_id):
+        with self._lock:
+            self._generations[doc_id] = self._generations.get(doc_id, 0) + 1
+            old = self._entries.pop(doc_id, None)
+            if old is not None:
+                self._bytes -= old[2]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+INDEX_CACHE = IndexCache(INDEX_CACHE_MAX_BYTES)
+
+
+def load_index_and_meta(doc_id: int):
+    key = index_key(doc_id)
+    version = key_version(key)
+    if version is None:
+        INDEX_CACHE.invalidate(key)
+        return None, None
+    cached = INDEX_CACHE.get(key, version)
+    if cached is not None:
+        return cached
+
+    generation = INDEX_CACHE.generation(key)
+    faiss_path, chunks_path, legacy_path = _key_paths(key)
+    chunks = read_chunks(chunks_path, legacy_path)
+    if chunks is None:
+        return None, None
+    index = faiss.read_index(faiss_path, FAISS_READ_FLAGS)
+    meta = {"chunks": chunks}
+    INDEX_CACHE.put(key, index, meta, _entry_bytes(faiss_path, meta), version, generation)
+    return index, meta
+
+
+class IndexWriter:
+    """Write a document's index while its chunks are still being produced:
+    append() streams chunks to disk, commit(index) publishes both files.
+    Leaving the with-block without commit() discards the chunks."""
+
+    def __init__(self, doc_id: int):
+        self.key = index_key(doc_id)
+        self.faiss_path, chunks_path, self.legacy_path = _key_paths(self.key)
+        os.makedirs(os.path.dirname(self.faiss_path), exist_ok=True)
+        self._chunks = ChunkWriter(chunks_path)
+        self._done = False
+
+    def append(self, text: str):
+        self._chunks.append(text)
+
+    def __len__(self):
+        return len(self._chunks)
+
+    def commit(self, index):
+        # chunks first, index last: the index file's stamp is the version readers
+        # check, and replace() leaves processes that mapped the old files intact
+        self._chunks.close()
+        self._done = True
+        tmp = f"{self.faiss_path}.tmp-{uuid.uuid4().hex}"
+        faiss.write_index(index, tmp)
+        os.replace(tmp, self.faiss_path)
+        if os.path.exists(self.legacy_path):
+            os.remove(self.legacy_path)
+        _notify_change(self.key)
+
+    def abort(self):
+        if not self._done:
+            self._chunks.abort()
+            self._done = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.abort()
+
+
+def remove_index(doc_id: int):
+    """Delete a pre-dedup document's own index files (blob indexes are
+    removed with their blob, see docs.blob_store.release)."""
+    key = index_key(doc_id)
+    if isinstance(key, str):
+        return
+    for path in _key_paths(key):
+        if os.path.exists(path):
+            os.remove(path)
+    _notify_change(key)
+
+
+def forget_key(key):
+    """Called after a blob directory is deleted."""
+    _notify_change(key)
@@ -0,0 +1,212 @@
+import os
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from models import db, Document, IngestJob, ContentBlob, DocumentBlob
+from docs.extract import extract_text_from_file
+from docs import blob_store, library_index
+
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+
+_EXECUTOR = ThreadPoolExecutor(max_workers=INGEST_WORKERS, thread_name_prefix="ingest")
+
+# percent reached at the *end* of each stage
+_STAGE_END = {"extract": 30, "chunk": 35, "embed": 95, "index": 100}
+
+
+_worker = None
+
+
+def worker_id() -> str:
+    """"<pid>:<uuid>" naming this process; made on first use, so after any
+    fork. A restarted process may get a dead owner's PID, never its uuid."""
+    global _worker
+    if _worker is None or not _worker.startswith(f"{os.getpid()}:"):
+        _worker = f"{os.getpid()}:{uuid.uuid4().hex}"
+    return _worker
+
+
+def _pid_alive(pid: int) -> bool:
+    if not pid:
+        return False
+    if os.name == "nt":
+        # os.kill(pid, 0) would terminate the process on Windows
+        import ctypes
+        handle = ctypes.windll.kernel32.OpenProcess(0x1000, False, pid)
+        if not handle:
+            return False
+        ctypes.windll.kernel32.CloseHandle(handle)
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _owner_alive(worker) -> bool:
+    if not worker:
+        return False
+    if worker == worker_id():
+        return True
+    pid = int(worker.partition(":")[0])
+    # our own PID with another token is a previous process that had our PID
+    return pid != os.getpid() and _pid_alive(pid)
+
+
+def _update(job, **fields):
+    for k, v in fields.items():
+        setattr(job, k, v)
+    db.session.commit()
+
+
+def active_job(doc_id: int):
+    """The unfinished ingestion job of a document, or None once it is ready."""
+    return (IngestJob.query
+            .filter(IngestJob.document_id == doc_id, IngestJob.status.in_(("queued", "running")))
+            .order_by(IngestJob.id.desc())
+            .first())
+
+
+def latest_job(doc_id: int):
+    job = IngestJob.query.filter_by(document_id=doc_id).order_by(IngestJob.id.desc()).first()
+    if job is None:
+        # duplicate upload: show the same user's job for the shared blob
+        sha = blob_store.blob_for_doc(doc_id)
+        doc = db.session.get(Document, doc_id)
+        if sha and doc:
+            job = (IngestJob.query
+                   .join(DocumentBlob, DocumentBlob.document_id == IngestJob.document_id)
+                   .filter(DocumentBlob.sha256 == sha, IngestJob.user_id == doc.user_id)
+                   .order_by(IngestJob.id.desc())
+                   .first())
+    return job
+
+
+def blob_job_active(sha: str) -> bool:
+    """Is some document's job already ingesting this content blob?"""
+    return (IngestJob.query
+            .join(DocumentBlob, DocumentBlob.document_id == IngestJob.document_id)
+            .filter(DocumentBlob.sha256 == sha, IngestJob.status.in_(("queued", "running")))
+            .first()) is not None
+
+
+def is_indexing(doc_id: int) -> bool:
+    if active_job(doc_id) is not None:
+        return True
+    # a duplicate upload waits on the job ingesting its shared blob
+    sha = blob_store.blob_for_doc(doc_id)
+    if sha:
+        blob = db.session.get(ContentBlob, sha)
+        return blob is not None and blob.status == "pending" and blob_job_active(sha)
+    return False
+
+
+def submit(app, job_id: int):
+    _EXECUTOR.submit(_run_job, app, job_id)
+
+
+def _run_job(app, job_id: int):
+    # imported here: docs.routes_docs and quiz.routes_quiz import this module
+    from docs.routes_docs import iter_words, iter_chunks, count_chunks, build_faiss_index
+    from quiz import bank as quiz_bank
+
+    with app.app_context():
+        job = db.session.get(IngestJob, job_id)
+        doc = db.session.get(Document, job.document_id) if job else None
+        if job is None or doc is None:
+            return
+        try:
+            _update(job, status="running", worker=worker_id())
+
+            # extracted text is persisted, so a resumed job skips re-extraction
+            if doc.extracted_text is None:
+                _update(job, stage="extract", progress=0)
+                doc.extracted_text = extract_text_from_file(job.save_path, doc.filename)
+            _update(job, stage="chunk", progress=_STAGE_END["extract"])
+
+            # chunks are produced lazily and streamed through embedding into the index
+            n_words = sum(1 for _ in iter_words(doc.extracted_text))
+            n_chunks = count_chunks(n_words, chunk_words=180, overlap_words=40)
+            chunks = iter_chunks(iter_words(doc.extracted_text), chunk_words=180, overlap_words=40)
+            _update(job, stage="embed", progress=_STAGE_END["chunk"], message=f"{n_chunks} chunks")
+
+            lo, hi = _STAGE_END["chunk"], _STAGE_END["embed"]
+            last = [lo]
+
+            def on_batch(done, total):
+                pct = lo + (hi - lo) * done // max(1, total)
+                if pct - last[0] >= 5:
+                    last[0] = pct
+                    _update(job, progress=pct)
+
+            def on_indexing():
+                _update(job, stage="index", progress=hi)
+
+            stats = {}
+            build_faiss_index(doc.id, chunks, on_batch=on_batch, on_indexing=on_indexing, stats=stats, total=n_chunks)
+            sha = blob_store.blob_for_doc(doc.id)
+            if sha:
+                blob_store.mark_ready(sha, doc.extracted_text)
+            # duplicates uploaded while this ran share the index; add them too
+            waiting = [doc] if not sha else (Document.query
+                                             .join(DocumentBlob, DocumentBlob.document_id == Document.id)
+                                             .filter(DocumentBlob.sha256 == sha).all())
+            for d in waiting:
+                try:
+                    library_index.add_document(d.user_id, d.id)
+                except Exception as e:   # rebuilt from the per-doc indexes on next load
+                    print("LIBRARY INDEX ERROR:", d.id, e)
+            msg = f"{n_chunks} chunks"
+            if stats:
+                msg += (f", {stats['reused']} embeddings reused, "
+                        f"{stats['api_calls_saved']} of {stats['api_calls'] + stats['api_calls_saved']} API calls saved")
+                print(f"INGEST {job_id}: {msg}")
+            _update(job, status="done", stage="done", progress=100, message=msg)
+            quiz_bank.schedule_fill(app, doc.id, count=quiz_bank.QUIZ_BANK_INITIAL)
+        except Exception as e:
+            print("INGEST ERROR:", job_id, e)
+            db.session.rollback()
+            _update(job, status="failed", message=str(e)[:500])
+            sha = blob_store.blob_for_doc(job.document_id)
+            if sha:
+                ContentBlob.query.filter_by(sha256=sha).update({"status": "failed"})
+                db.session.commit()
+        finally:
+            db.session.remove()
+
+
+_resumed = threading.Event()
+
+
+def resume_pending_jobs(app):
+    """Re-queue jobs whose owning process died (e.g. a server restart).
+
+    Ownership is claimed with a compare-and-swap on the worker id, so when
+    several worker processes start together each job is resumed only once.
+    """
+    me = worker_id()
+    with app.app_context():
+        pending = IngestJob.query.filter(IngestJob.status.in_(("queued", "running"))).all()
+        for job in pending:
+            if _owner_alive(job.worker):
+                continue
+            claimed = (IngestJob.query
+                       .filter_by(id=job.id, worker=job.worker)
+                       .update({"worker": me, "status": "queued"}, synchronize_session=False))
+            db.session.commit()
+            if claimed:
+                submit(app, job.id)
+        db.session.remove()
+
+
+def init_app(app):
+    # Resume on the first request rather than at import time, so scripts that
+    # only import the app (create_db.py, flask shell) never start ingestion.
+    @app.before_request
+    def _resume_once():
+        if not _resumed.is_set():
+            _resumed.set()
+            resume_pending_jobs(app)
@@ -0,0 +1,328 @@
+import os
+import json
+import math
+import uuid
+import threading
+import numpy as np
+import faiss
+
+from docs.index_store import IndexCache, load_index_and_meta
+from docs.index_factory import INDEX_KIND, INDEX_RESCORE, INDEX_TRAIN_SAMPLE, code_string, shortlist_size, rescore
+
+# instance/libraries/<user_id>.faiss + .meta.json: one index over all of a user's documents
+LIBRARY_DIR = os.path.join("instance", "libraries")
+LIBRARY_CACHE_MAX_BYTES = int(os.getenv("LIBRARY_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+# vectors at which a library switches from exact (flat) to IVF search
+LIBRARY_IVF_THRESHOLD = int(os.getenv("LIBRARY_IVF_THRESHOLD", "20000"))
+LIBRARY_NPROBE = int(os.getenv("LIBRARY_NPROBE", "32"))
+
+# FAISS ids are doc_id << CHUNK_BITS | chunk_no, so one doc is one contiguous id range
+CHUNK_BITS = 20
+
+
+def chunk_id(doc_id: int, chunk_no: int) -> int:
+    return (doc_id << CHUNK_BITS) | chunk_no
+
+
+def split_id(i: int):
+    return int(i) >> CHUNK_BITS, int(i) & ((1 << CHUNK_BITS) - 1)
+
+
+def _doc_range(doc_id: int):
+    return faiss.IDSelectorRange(doc_id << CHUNK_BITS, (doc_id + 1) << CHUNK_BITS)
+
+
+def doc_selector(doc_ids):
+    """IDSelector matching every chunk of `doc_ids` -> (selector, keepalive).
+
+    SWIG does not keep the operands of IDSelectorOr alive, so callers hold
+    on to `keepalive` until the search returns.
+    """
+    keep = [_doc_range(d) for d in doc_ids]
+    sel = keep[0]
+    for rhs in keep[1:]:
+        sel = faiss.IDSelectorOr(sel, rhs)
+        keep.append(sel)
+    return sel, keep
+
+
+# ------------------- index structure -------------------
+def new_flat(X: np.ndarray, ids: np.ndarray, kind: str = "flat"):
+    """Brute-force index over (X, ids), vectors stored as `kind` (see
+    docs.index_factory). SQ8 codes are trained on up to INDEX_TRAIN_SAMPLE
+    rows of X. Searches with a doc filter need flat or SQ8."""
+    n, d = X.shape
+    index = faiss.index_factory(d, f"IDMap2,{code_string(kind, n, d)}", faiss.METRIC_INNER_PRODUCT)
+    sub = faiss.downcast_index(index.index)
+    if isinstance(sub, faiss.IndexPQ):
+        sub.do_polysemous_training = False   # only helps Hamming search, costs seconds
+    if not index.is_trained:
+        sample = X if n <= INDEX_TRAIN_SAMPLE else X[np.random.default_rng(0).choice(n, INDEX_TRAIN_SAMPLE, replace=False)]
+        index.train(sample)
+    index.add_with_ids(X, ids)
+    return index
+
+
+def new_ivf(X: np.ndarray, ids: np.ndarray, kind: str = "flat"):
+    """IVF over (X, ids) with nlist ~ sqrt(n), trained on a 64-per-list sample
+    (at least 10k vectors when PQ codebooks are trained too). List entries are
+    stored as `kind` (see docs.index_factory).
+
+    IVF keeps remove_ids support, which HNSW does not have, so deletes stay
+    incremental.
+    """
+    n, d = X.shape
+    nlist = min(n, max(16, min(65536, int(math.sqrt(n)))))
+    index = faiss.index_factory(d, f"IVF{nlist},{code_string(kind, n, d)}", faiss.METRIC_INNER_PRODUCT)
+    n_train = max(64 * nlist, 10000 if kind == "pq" else 0)
+    sample = X if n <= n_train else X[np.random.default_rng(0).choice(n, n_train, replace=False)]
+    index.train(sample)
+    index.add_with_ids(X, ids)
+    return index
+
+
+def search_index(index, kind: str, qv: np.ndarray, top_k: int, doc_ids=None):
+    """-> list of (score, doc_id, chunk_no), best first."""
+    return search_index_many(index, kind, qv, top_k, doc_ids)[0]
+
+
+def search_index_many(index, kind: str, Q: np.ndarray, top_k: int, doc_ids=None):
+    """One index.search over a query matrix. -> one hit list per row of Q."""
+    Q = np.asarray(Q, dtype=np.float32).reshape(-1, index.d)
+    keep = None
+    if kind == "ivf":
+        # a doc filter leaves few candidates per list, so probe every list:
+        # the selector skips non-matching ids before any distance is computed
+        nprobe = faiss.extract_index_ivf(index).nlist if doc_ids else LIBRARY_NPROBE
+        params = faiss.SearchParametersIVF(nprobe=nprobe)
+    else:
+        params = faiss.SearchParameters()
+    if doc_ids:
+        params.sel, keep = doc_selector(doc_ids)
+    scores, ids = index.search(Q, top_k, params=params)
+    del keep
+    return [[(float(s), *split_id(i)) for s, i in zip(srow, irow) if i != -1]
+            for srow, irow in zip(scores, ids)]
+
+
+# ------------------- per-user libraries -------------------
+LIBRARY_CACHE = IndexCache(LIBRARY_CACHE_MAX_BYTES)
+_user_locks = {}
+_locks_guard = threading.Lock()
+
+
+def _lock(user_id: int):
+    with _locks_guard:
+        return _user_locks.setdefault(user_id, threading.RLock())
+
+
+def _paths(user_id: int):
+    base = os.path.abspath(LIBRARY_DIR)
+    return os.path.join(base, f"{user_id}.faiss"), os.path.join(base, f"{user_id}.meta.json")
+
+
+def library_version(user_id: int):
+    try:
+        st = os.stat(_paths(user_id)[0])
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def _doc_vectors(doc_id: int):
+    """Exact vectors from the embedding store; a document indexed before it
+    existed falls back to its index (approximate if that is SQ8/PQ)."""
+    index, meta = load_index_and_meta(doc_id)
+    if index is None or index.ntotal == 0:
+        return None
+    from docs.embedding import EMB_MODEL
+    from docs.embedding_store import EMBEDDING_STORE, chunk_key
+    keys = [chunk_key(c, EMB_MODEL) for c in meta["chunks"]]
+    vecs = EMBEDDING_STORE.get_many(keys)
+    if len(keys) == index.ntotal and all(k in vecs for k in keys):
+        return np.vstack([vecs[k] for k in keys]).astype(np.float32)
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def _nbytes(index) -> int:
+    return index.ntotal * index.d * 4 + 64 * 1024
+
+
+def _save(user_id: int, index, meta: dict):
+    faiss_path, meta_path = _paths(user_id)
+    os.makedirs(os.path.dirname(faiss_path), exist_ok=True)
+    tmp = f".tmp-{uuid.uuid4().hex}"   # the user lock is per process
+    with open(meta_path + tmp, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(meta_path + tmp, meta_path)
+    faiss.write_index(index, faiss_path + tmp)
+    os.replace(faiss_path + tmp, faiss_path)
+    LIBRARY_CACHE.put(user_id, index, meta, _nbytes(index), library_version(user_id),
+                      LIBRARY_CACHE.generation(user_id))
+
+
+def _doc_ids(doc_id: int, n: int) -> np.ndarray:
+    return np.fromiter((chunk_id(doc_id, i) for i in range(n)), dtype=np.int64, count=n)
+
+
+def _add(index, meta: dict, doc_id: int, X: np.ndarray):
+    index.add_with_ids(X, _doc_ids(doc_id, len(X)))
+    meta["docs"][str(doc_id)] = len(X)
+
+
+def _build(meta: dict, X: np.ndarray, ids: np.ndarray):
+    """New library over (X, ids) stored as INDEX_KIND: flat, or IVF past
+    LIBRARY_IVF_THRESHOLD. Codes are trained on X itself, which
+    _doc_vectors takes from the embedding store."""
+    if len(X) == 0:
+        meta.update(kind="flat", trained_on=0, code="flat")   # nothing to train on yet
+        return new_flat(X, ids)
+    # IndexPQ cannot take an IDSelector (doc filters), IVF lists of PQ codes can
+    kind = "ivf" if len(X) > LIBRARY_IVF_THRESHOLD or INDEX_KIND == "pq" else "flat"
+    meta.update(kind=kind, trained_on=len(X), code=INDEX_KIND)
+    return (new_ivf if kind == "ivf" else new_flat)(X, ids, INDEX_KIND)
+
+
+def _rebuild(meta: dict, d: int):
+    """Rebuild from the per-document vectors, as flat or IVF by size."""
+    parts, ids = [], []
+    for key in list(meta["docs"]):
+        X = _doc_vectors(int(key))
+        if X is None:
+            del meta["docs"][key]
+            continue
+        parts.append(X)
+        ids.append(_doc_ids(int(key), len(X)))
+        meta["docs"][key] = len(X)
+    X = np.vstack(parts) if parts else np.zeros((0, d), dtype=np.float32)
+    ids = np.concatenate(ids) if ids else np.zeros(0, dtype=np.int64)
+    return _build(meta, X, ids)
+
+
+def _new_library(meta: dict, doc_id: int, X: np.ndarray):
+    index = _build(meta, X, _doc_ids(doc_id, len(X)))
+    meta["docs"][str(doc_id)] = len(X)
+    return index
+
+
+def _needs_rebuild(index, meta: dict) -> bool:
+    if index.ntotal and meta.get("code", "flat") != INDEX_KIND:
+        return True   # INDEX_KIND changed since this library was built
+    if meta["kind"] == "flat" and index.ntotal > LIBRARY_IVF_THRESHOLD:
+        return True
+    if meta["kind"] == "flat" and meta.get("code", "flat") == "flat":
+        return False   # nothing trained
+    # retrain once the library has grown well past what the codes/centroids saw
+    return index.ntotal > 4 * meta["trained_on"]
+
+
+def _reconcile(user_id: int, index, meta: dict):
+    """Bring a library loaded from disk in line with the user's documents
+    (covers a missing file and updates made by another process)."""
+    from models import Document
+    have = {int(k) for k in meta["docs"]}
+    want = {d.id for d in Document.query.filter_by(user_id=user_id).with_entities(Document.id)}
+    changed = False
+    for doc_id in have - want:
+        index.remove_ids(_doc_range(doc_id))
+        del meta["docs"][str(doc_id)]
+        changed = True
+    for doc_id in sorted(want - have):
+        X = _doc_vectors(doc_id)
+        if X is not None:
+            if index is None:
+                index = _new_library(meta, doc_id, X)
+            else:
+                _add(index, meta, doc_id, X)
+            changed = True
+    if index is not None and _needs_rebuild(index, meta):
+        index = _rebuild(meta, index.d)
+        changed = True
+    return index, changed
+
+
+def _load(user_id: int):
+    """-> (index or None, meta); caller holds the user's lock."""
+    version = library_version(user_id)
+    cached = LIBRARY_CACHE.get(user_id, version) if version else None
+    if cached is not None:
+        return cached
+    faiss_path, meta_path = _paths(user_id)
+    index, meta = None, {"docs": {}, "kind": "flat", "trained_on": 0, "code": "flat"}
+    if version and os.path.exists(meta_path):
+        index = faiss.read_index(faiss_path)
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+    index, changed = _reconcile(user_id, index, meta)
+    if index is None:
+        return None, meta
+    if changed:
+        _save(user_id, index, meta)
+    else:
+        LIBRARY_CACHE.put(user_id, index, meta, _nbytes(index), version, LIBRARY_CACHE.generation(user_id))
+    return index, meta
+
+
+def add_document(user_id: int, doc_id: int):
+    """Add a freshly indexed document's chunks to the user's library."""
+    with _lock(user_id):
+        index, meta = _load(user_id)
+        if str(doc_id) in meta["docs"]:
+            return
+        X = _doc_vectors(doc_id)
+        if X is None:
+            return
+        if index is None:
+            index = _new_library(meta, doc_id, X)
+        else:
+            _add(index, meta, doc_id, X)
+        if _needs_rebuild(index, meta):
+            index = _rebuild(meta, index.d)
+        _save(user_id, index, meta)
+
+
+def remove_document(user_id: int, doc_id: int):
+    with _lock(user_id):
+        index, meta = _load(user_id)
+        if index is None or str(doc_id) not in meta["docs"]:
+            return
+        index.remove_ids(_doc_range(doc_id))
+        del meta["docs"][str(doc_id)]
+        _save(user_id, index, meta)
+
+
+def search_library_many(user_id: int, Q: np.ndarray, top_k: int = 4, doc_ids=None):
+    """Search every document of a user (or only `doc_ids`) with a matrix of
+    queries in one index.search.
+
+    A compressed (SQ8/PQ) library is searched for a larger shortlist that
+    is re-scored exactly. -> one hit list per row of Q, each a list of
+    (score, doc_id, chunk_no), best first.
+    """
+    Q = np.asarray(Q, dtype=np.float32)
+    Q = Q.reshape(-1, Q.shape[-1])
+    with _lock(user_id):
+        index, meta = _load(user_id)
+        if index is None or index.ntotal == 0:
+            return [[] for _ in range(Q.shape[0])]
+        exact = meta.get("code", "flat") == "flat"
+        hits = search_index_many(index, meta["kind"], Q, shortlist_size(top_k, exact), doc_ids)
+    if exact or not INDEX_RESCORE:
+        return [h[:top_k] for h in hits]
+    return [rescore(q, h, chunk_texts(h), top_k)[0] for q, h in zip(Q, hits)]
+
+
+def library_docs(user_id: int) -> set:
+    with _lock(user_id):
+        return {int(k) for k in _load(user_id)[1]["docs"]}
+
+
+def chunk_texts(hits):
+    """Resolve (score, doc_id, chunk_no) hits to chunk strings via the
+    per-document chunk lists (already cached by INDEX_CACHE)."""
+    out = []
+    for _, doc_id, chunk_no in hits:
+        _, meta = load_index_and_meta(doc_id)
+        chunks = meta.get("chunks", []) if meta else []
+        out.append(chunks[chunk_no] if chunk_no < len(chunks) else "")
+    return out
@@ -1,128 +1,109 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app
 from flask_login import login_required, current_user
-import os, json, numpy as np
+import os, re
+from collections import deque
 from werkzeug.utils import secure_filename
 
-# OCR / Extraction
-from pypdf import PdfReader
-import docx
-from pdf2image import convert_from_path
-import pytesseract
-
-# Tesseract path
-pytesseract.pytesseract.tesseract_cmd = r"C:\\Program Files\\Tesseract-OCR\\tesseract.exe"
-
 # DB models
-from models import Document, db
+from models import Document, IngestJob, DocumentBlob, db
 
-# Summarizer (BART)
-from transformers import BartTokenizer, BartForConditionalGeneration
-import torch
+# Summarizer (BART, map-reduce for long documents; model loads on first use)
+from docs.summary_cache import get_summary
+from docs.extractive import extractive_summarize
+from docs.summarizer_server import SummarizerBusy, SummarizerError
 
 # Gemini embeddings
-import google.generativeai as genai
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-EMB_MODEL = "models/text-embedding-004"
-
-# FAISS vector index
-import faiss
+from docs.embedding import embed_stream
+from docs.embedding_store import EMBEDDING_STORE
+from docs.index_factory import IndexBuilder
+from docs.index_store import IndexWriter, remove_index
+from docs import ingest, blob_store, library_index
+from quiz import bank as quiz_bank
 
 docs_bp = Blueprint('docs_bp', __name__)
 
 # ------------------- CONSTANTS -------------------
 UPLOAD_FOLDER = 'uploads'
 ALLOWED_EXTENSIONS = {'pdf', 'txt', 'docx'}
-POPPLER_BIN = r"C:\poppler-25.07.0\Library\bin"
-INDEX_DIR = os.path.join("instance", "indexes")
-os.makedirs(INDEX_DIR, exist_ok=True)
-
-# ------------------- BART -------------------
-_DEVICE = "cpu"
-_BART_TOKENIZER = BartTokenizer.from_pretrained("facebook/bart-large-cnn")
-_BART_MODEL = BartForConditionalGeneration.from_pretrained("facebook/bart-large-cnn").to(_DEVICE)
-
-def bart_summarize(text, target_words=50):
-    approx_tokens = int(max(32, target_words * 1.35))
-    inputs = _BART_TOKENIZER(text, return_tensors="pt", max_length=1024, truncation=True).to(_DEVICE)
-    ids = _BART_MODEL.generate(
-        inputs["input_ids"],
-        num_beams=4,
-        length_penalty=2.0,
-        max_length=approx_tokens,
-        min_length=max(20, approx_tokens // 2),
-        no_repeat_ngram_size=3,
-        early_stopping=True,
-    )
-    return _BART_TOKENIZER.decode(ids[0], skip_special_tokens=True)
 
 # ------------------- Helpers -------------------
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def chunk_text_words(text: str, chunk_words=180, overlap_words=40):
-    words = text.split()
-    chunks = []
-    i = 0
+def iter_words(text: str):
+    """Whitespace-separated words without materializing text.split()."""
+    for m in re.finditer(r"\S+", text):
+        yield m.group()
+
+def iter_chunks(words, chunk_words=180, overlap_words=40):
+    """Overlapping word windows over any word iterable, holding one window."""
     stride = max(1, chunk_words - overlap_words)
-    while i < len(words):
-        chunk = words[i:i+chunk_words]
-        if not chunk: break
-        chunks.append(" ".join(chunk))
-        i += stride
-    return chunks
-
-def embed_text_gemini(text: str) -> np.ndarray:
-    resp = genai.embed_content(model=EMB_MODEL, content=text)
-    v = np.array(resp["embedding"], dtype=np.float32)
-    n = np.linalg.norm(v) + 1e-12
-    return v / n
-
-def build_faiss_index(doc_id: int, chunks: list[str]):
-    if not chunks:
-        return
-    vecs = [embed_text_gemini(ch) for ch in chunks]
-    X = np.vstack(vecs).astype(np.float32)
-    d = X.shape[1]
-    index = faiss.IndexFlatIP(d)
-    index.add(X)
-
-    base = os.path.abspath(INDEX_DIR)
-    os.makedirs(base, exist_ok=True)
-    faiss_path = os.path.join(base, f"{doc_id}.faiss")
-    meta_path = os.path.join(base, f"{doc_id}.meta.json")
-
-    faiss.write_index(index, faiss_path)
-    with open(meta_path, "w", encoding="utf-8") as f:
-        json.dump({"chunks": chunks}, f, ensure_ascii=False)
-
-def extract_text_from_file(save_path: str, filename: str) -> str:
-    text = ""
-    if filename.lower().endswith(".pdf"):
-        try:
-            reader = PdfReader(save_path)
-            for page in reader.pages:
-                t = page.extract_text()
-                if t:
-                    text += t
-        except Exception:
-            pass
-        if not text.strip():
-            pages = convert_from_path(save_path, poppler_path=POPPLER_BIN)
-            for img in pages:
-                text += pytesseract.image_to_string(img)
-    elif filename.lower().endswith(".docx"):
-        d = docx.Document(save_path)
-        for para in d.paragraphs:
-            text += para.text + "\n"
-    else:
-        with open(save_path, "rb") as fh:
-            raw = fh.read()
-        text = raw.decode("utf-8", errors="ignore")
-    return text
+    window = deque()
+    for w in words:
+        window.append(w)
+        if len(window) == chunk_words:
+            yield " ".join(window)
+            for _ in range(min(stride, len(window))):
+                window.popleft()
+    while window:
+        yield " ".join(window)
+        for _ in range(min(stride, len(window))):
+            window.popleft()
+
+def count_chunks(n_words: int, chunk_words=180, overlap_words=40) -> int:
+    return len(range(0, n_words, max(1, chunk_words - overlap_words)))
+
+def index_chunks(chunks, on_chunk, on_batch=None, total=None, stats=None, store=EMBEDDING_STORE, embed_batch=None):
+    """chunks -> batched embeddings -> incremental index.add, streaming each
+    chunk to `on_chunk` as its batch lands. Only EMBED_INFLIGHT batches are
+    in memory at once. -> the index (None for no chunks)"""
+    builder = IndexBuilder(expected=total)
+    for batch, X in embed_stream(chunks, embed_batch=embed_batch, store=store, stats=stats):
+        for c in batch:
+            on_chunk(c)
+        builder.add(X)
+        if on_batch:
+            on_batch(builder.ntotal, max(total or 0, builder.ntotal))
+    return builder.finish()
+
+def build_faiss_index(doc_id: int, chunks, on_batch=None, on_indexing=None, stats=None, total=None):
+    """`chunks` may be a generator (see iter_chunks); `total`, if known, is
+    the chunk count reported to on_batch."""
+    with IndexWriter(doc_id) as writer:
+        index = index_chunks(chunks, writer.append, on_batch=on_batch, total=total, stats=stats)
+        if index is None:
+            return
+        if on_indexing:
+            on_indexing()
+        writer.commit(index)
 
 def get_latest_doc(user_id: int):
     return Document.query.filter_by(user_id=user_id).order_by(Document.id.desc()).first()
 
+def summary_mode() -> str:
+    """?mode=extractive (instant, sentences from the text) or abstractive (BART, the default)."""
+    mode = (request.args.get("mode") or "abstractive").lower()
+    return mode if mode in ("extractive", "abstractive") else "abstractive"
+
+def summarize_text(text: str, target_words: int, error_endpoint: str):
+    """Summary in the requested mode -> (summary, None), or (None, a redirect
+    to `error_endpoint`) once the reason has been flashed."""
+    try:
+        if summary_mode() == "extractive":
+            final_summary, status = extractive_summarize(text, target_words), "extractive"
+        else:
+            final_summary, status = get_summary(current_app._get_current_object(), text, target_words)
+    except SummarizerBusy:
+        flash("The summarizer is busy right now. Please try again in a moment.", "warning")
+        return None, redirect(url_for(error_endpoint))
+    except SummarizerError as e:
+        print("SUMMARIZER ERROR:", e)
+        flash("Summarization failed. Please try again.", "danger")
+        return None, redirect(url_for(error_endpoint))
+    if status == "stale":
+        flash("Showing the previous summary; an updated one is being generated.", "info")
+    return final_summary, None
+
 # ------------------- ROUTES -------------------
 @docs_bp.route('/upload', methods=['GET', 'POST'])
 @login_required
@@ -134,23 +115,48 @@ def upload():
             return redirect(url_for('docs_bp.upload'))
 
         filename = secure_filename(file.filename)
-        os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-        save_path = os.path.join(UPLOAD_FOLDER, filename)
-        file.save(save_path)
-
-        text = extract_text_from_file(save_path, filename)
+        wants_json = request.accept_mimetypes.best == "application/json"
+        sha, tmp_path = blob_store.save_and_hash(file, UPLOAD_FOLDER)
 
-        doc = Document(user_id=current_user.id, filename=filename, extracted_text=text)
+        doc = Document(user_id=current_user.id, filename=filename, extracted_text=None)
         db.session.add(doc)
         db.session.commit()
+        blob = blob_store.acquire(sha, doc.id, tmp_path, filename)
+
+        if blob.status == "ready":
+            # byte-identical upload: reuse its text, chunks and FAISS index
+            doc.extracted_text = blob.extracted_text
+            db.session.commit()
+            library_index.add_document(current_user.id, doc.id)
+            if wants_json:
+                return jsonify({"document_id": doc.id, "status": "done", "stage": "done",
+                                "progress": 100, "deduplicated": True}), 201
+            flash("Document uploaded. Identical content was already indexed, so it is ready now.")
+            return redirect(url_for('docs_bp.upload'))
 
-        chunks = chunk_text_words(text, chunk_words=180, overlap_words=40)
-        build_faiss_index(doc.id, chunks)
+        if not blob_store.claim(sha):
+            if wants_json:
+                return jsonify({"document_id": doc.id, "status": "queued", "stage": "queued",
+                                "progress": 0, "deduplicated": True}), 202
+            flash("Document uploaded. Identical content is being indexed right now.")
+            return redirect(url_for('docs_bp.upload'))
 
-        flash("Document uploaded, extracted & indexed (FAISS).")
+        # new content (or an earlier attempt failed):
+        # extract -> chunk -> embed -> index runs on the ingest worker pool
+        job = IngestJob(user_id=current_user.id, document_id=doc.id,
+                        save_path=blob_store.existing_source(sha), worker=ingest.worker_id())
+        db.session.add(job)
+        db.session.commit()   # ends the claim's transaction
+        ingest.submit(current_app._get_current_object(), job.id)
+
+        if wants_json:
+            return jsonify({**job.to_dict(),
+                            "status_url": url_for('docs_bp.upload_status', job_id=job.id)}), 202
+        flash(f"Document uploaded. Indexing in the background (job #{job.id}).")
         return redirect(url_for('docs_bp.upload'))
 
     latest = get_latest_doc(current_user.id)
+    job = ingest.latest_job(latest.id) if latest else None
     extracted_text = latest.extracted_text if latest else None
     summary = latest.summary if (latest and latest.summary) else None
     total_words = len(extracted_text.split()) if extracted_text else 0
@@ -161,14 +167,23 @@ def upload():
 
     return render_template(
         "upload.html",
-        latest_exists=latest_exists,
+        latest_exists=latest_exists and not (job and job.active),
         extracted_text=extracted_text,
         summary=summary,
         total_words=total_words,
         summary_words=summary_words,
-        ratio=ratio
+        ratio=ratio,
+        ingest_job=job
     )
 
+@docs_bp.route('/upload/status/<int:job_id>')
+@login_required
+def upload_status(job_id):
+    job = IngestJob.query.filter_by(id=job_id, user_id=current_user.id).first()
+    if not job:
+        return jsonify({"error": "job not found"}), 404
+    return jsonify(job.to_dict())
+
 @docs_bp.route('/summarize', methods=['GET'])
 @login_required
 def summarize_latest():
@@ -176,6 +191,9 @@ def summarize_latest():
     if not latest:
         flash("Please upload a document first.")
         return redirect(url_for('docs_bp.upload'))
+    if ingest.is_indexing(latest.id):
+        flash("Your document is still indexing. Please try again in a moment.")
+        return redirect(url_for('docs_bp.upload'))
 
     text = latest.extracted_text or ""
     total_words = len(text.split())
@@ -184,12 +202,14 @@ def summarize_latest():
         return redirect(url_for('docs_bp.upload'))
 
     target_words = max(35, int(total_words * 0.35))
-    raw = bart_summarize(text, target_words)
-    raw_words = raw.split()
-    final_summary = " ".join(raw_words[:target_words]) if len(raw_words) > target_words else raw
+    final_summary, failed = summarize_text(text, target_words, 'docs_bp.upload')
+    if failed:
+        return failed
 
-    latest.summary = final_summary
-    db.session.commit()
+    if summary_mode() == "abstractive":
+        # extractive output is a preview; it must not replace the stored summary
+        latest.summary = final_summary
+        db.session.commit()
 
     summary_words = len(final_summary.split())
     ratio = round((summary_words / total_words) * 100, 2)
@@ -214,6 +234,9 @@ def summarize_specific(doc_id):
     if not doc:
         flash("Document not found.", "danger")
         return redirect(url_for('docs_bp.history'))
+    if ingest.is_indexing(doc.id):
+        flash("This document is still indexing. Please try again in a moment.", "warning")
+        return redirect(url_for('docs_bp.history'))
 
     text = doc.extracted_text or ""
     if not text.strip():
@@ -222,12 +245,14 @@ def summarize_specific(doc_id):
 
     total_words = len(text.split())
     target_words = max(35, int(total_words * 0.35))
-    raw = bart_summarize(text, target_words)
-    raw_words = raw.split()
-    final_summary = " ".join(raw_words[:target_words]) if len(raw_words) > target_words else raw
+    final_summary, failed = summarize_text(text, target_words, 'docs_bp.history')
+    if failed:
+        return failed
 
-    doc.summary = final_summary
-    db.session.commit()
+    if summary_mode() == "abstractive":
+        # extractive output is a preview; it must not replace the stored summary
+        doc.summary = final_summary
+        db.session.commit()
 
     summary_words = len(final_summary.split())
     ratio = round((summary_words / total_words) * 100, 2)
@@ -255,17 +280,24 @@ def delete_doc(doc_id):
     if not doc:
         flash("Document not found.", "danger")
         return redirect(url_for('docs_bp.history'))
+    if ingest.is_indexing(doc.id):
+        # the running job would write an index and library entry for a deleted doc
+        flash("This document is still indexing. Delete it once it is ready.", "warning")
+        return redirect(url_for('docs_bp.history'))
 
-    file_paths = [
-        f"uploads/{doc.filename}",
-        f"instance/indexes/{doc.id}.faiss",
-        f"instance/indexes/{doc.id}.meta.json"
-    ]
-    for path in file_paths:
-        abs_path = os.path.abspath(path)
+    library_index.remove_document(current_user.id, doc.id)
+    quiz_key = quiz_bank.content_key(doc.id)
+    # blob-backed documents only drop a reference; the blob goes with the last one
+    if not blob_store.release(doc.id):
+        abs_path = os.path.abspath(f"uploads/{doc.filename}")
         if os.path.exists(abs_path):
             os.remove(abs_path)
+        remove_index(doc.id)
+        quiz_bank.forget_content(quiz_key)
+    elif not DocumentBlob.query.filter_by(sha256=quiz_key).first():
+        quiz_bank.forget_content(quiz_key)
 
+    IngestJob.query.filter_by(document_id=doc.id).delete()
     db.session.delete(doc)
     db.session.commit()
     flash("Document deleted successfully.", "success")
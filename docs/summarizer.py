@@ -0,0 +1,218 @@
+import os
+import re
+import threading
+
+MODEL_NAME = "facebook/bart-large-cnn"
+_DEVICE = "cpu"
+
+# Inference backend (compare them with benchmarks/bench_summarizer_backends.py):
+#   fp32 - stock BartForConditionalGeneration
+#   int8 - dynamic int8 quantization of every nn.Linear (weights int8, activations fp32)
+#   bf16 - bfloat16 weights (fast on CPUs with AVX512-BF16 / AMX)
+#   onnx - exported ONNX graph run by onnxruntime (needs `pip install optimum[onnxruntime]`)
+SUMMARIZER_BACKENDS = ("fp32", "int8", "bf16", "onnx")
+SUMMARIZER_BACKEND = os.getenv("SUMMARIZER_BACKEND", "fp32").lower()
+SUMMARY_NUM_BEAMS = int(os.getenv("SUMMARY_NUM_BEAMS", "4"))
+
+MAX_INPUT_TOKENS = 1024
+# Map-reduce knobs for documents longer than one BART window
+SUMMARY_SEGMENT_TOKENS = int(os.getenv("SUMMARY_SEGMENT_TOKENS", "900"))
+SUMMARY_BATCH_SIZE = int(os.getenv("SUMMARY_BATCH_SIZE", "4"))    # segments per generate()
+SUMMARY_MAX_LEVELS = int(os.getenv("SUMMARY_MAX_LEVELS", "4"))
+SUMMARY_THREADS = int(os.getenv("SUMMARY_THREADS", str(os.cpu_count() or 1)))
+SUMMARY_INTEROP_THREADS = int(os.getenv("SUMMARY_INTEROP_THREADS", "0"))   # 0 = torch default
+MAX_SEGMENT_SUMMARY_TOKENS = 400
+
+# SUMMARIZER_SOCKET set: bart_summarize() is served by docs/summarizer_server.py
+# over that Unix socket (one model copy for every web worker) instead of in-process.
+SUMMARIZER_SOCKET = os.getenv("SUMMARIZER_SOCKET", "")
+
+# bump when a code change makes summaries of the same text differ
+SUMMARY_ALGO_VERSION = 2
+
+_load_lock = threading.Lock()
+_tok_lock = threading.Lock()   # fast tokenizers must not be used by two threads at once
+_BART_TOKENIZER = None
+_BART_MODEL = None
+
+_SENT_SPLIT = re.compile(r"(?<=[.!?])\s+")
+
+
+def _build_model(backend: str):
+    import torch
+    if backend not in SUMMARIZER_BACKENDS:
+        raise ValueError(f"SUMMARIZER_BACKEND must be one of {SUMMARIZER_BACKENDS}, got {backend!r}")
+    if backend == "onnx":
+        try:
+            from optimum.onnxruntime import ORTModelForSeq2SeqLM
+        except ImportError as e:
+            raise RuntimeError("SUMMARIZER_BACKEND=onnx needs `pip install optimum[onnxruntime]`") from e
+        return ORTModelForSeq2SeqLM.from_pretrained(MODEL_NAME, export=True)
+
+    from transformers import BartForConditionalGeneration
+    model = BartForConditionalGeneration.from_pretrained(MODEL_NAME).to(_DEVICE)
+    model.eval()
+    if backend == "int8":
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    elif backend == "bf16":
+        model = model.to(torch.bfloat16)
+    return model
+
+
+def load():
+    """(tokenizer, model), loaded once per process on first use.
+
+    torch/transformers are imported here too, so importing this module (and
+    create_app()) stays cheap; call this from a warm-up hook to pay the cost
+    before the first request instead.
+    """
+    global _BART_TOKENIZER, _BART_MODEL
+    if _BART_MODEL is None:
+        with _load_lock:
+            if _BART_MODEL is None:
+                import torch
+                from transformers import BartTokenizerFast
+                torch.set_num_threads(SUMMARY_THREADS)
+                if SUMMARY_INTEROP_THREADS:
+                    try:
+                        torch.set_num_interop_threads(SUMMARY_INTEROP_THREADS)
+                    except RuntimeError:
+                        pass   # can only be set before parallel work has started
+                # fast (Rust) tokenizer: same ids as BartTokenizer, but whole books tokenize in ms
+                tokenizer = BartTokenizerFast.from_pretrained(MODEL_NAME)
+                model = _build_model(SUMMARIZER_BACKEND)
+                _BART_TOKENIZER = tokenizer
+                _BART_MODEL = model
+    return _BART_TOKENIZER, _BART_MODEL
+
+
+def config_version() -> str:
+    """Everything that changes the output for a given text and target length;
+    cached summaries made under another version are recomputed."""
+    return (f"{MODEL_NAME}|{SUMMARIZER_BACKEND}|beams={SUMMARY_NUM_BEAMS}|seg={SUMMARY_SEGMENT_TOKENS}"
+            f"|batch={SUMMARY_BATCH_SIZE}|levels={SUMMARY_MAX_LEVELS}|v{SUMMARY_ALGO_VERSION}")
+
+
+def _tokens_for_words(words: int) -> int:
+    return int(max(32, words * 1.35))
+
+
+def token_budget(target_words: int) -> int:
+    """max_length of generate() for one input; min_length is half of it."""
+    return min(_tokens_for_words(target_words), MAX_SEGMENT_SUMMARY_TOKENS)
+
+
+def _generate(texts: list[str], target_words: list[int]) -> list[str]:
+    """Batched forward passes over several (padded) inputs.
+
+    Inputs with the same token_budget() share one generate() call, so every
+    input gets exactly the length limits it would get on its own and a
+    summary never depends on what it was batched with.
+    """
+    import torch
+    tokenizer, model = load()
+    groups = {}
+    for i, w in enumerate(target_words):
+        groups.setdefault(token_budget(w), []).append(i)
+    out = [None] * len(texts)
+    for budget, idx in groups.items():
+        with _tok_lock:
+            inputs = tokenizer([texts[i] for i in idx], return_tensors="pt", max_length=MAX_INPUT_TOKENS,
+                               truncation=True, padding=True).to(_DEVICE)
+        with torch.inference_mode():
+            ids = model.generate(
+                inputs["input_ids"],
+                attention_mask=inputs["attention_mask"],
+                num_beams=SUMMARY_NUM_BEAMS,
+                length_penalty=2.0,
+                max_length=budget,
+                min_length=max(20, budget // 2),
+                no_repeat_ngram_size=3,
+                early_stopping=True,
+            )
+        for i, summary in zip(idx, tokenizer.batch_decode(ids, skip_special_tokens=True)):
+            out[i] = summary
+    return out
+
+
+def split_segments(text: str, segment_tokens: int = None) -> list[tuple[str, int]]:
+    """Pack whole sentences into segments of at most `segment_tokens` tokens.
+
+    Returns (segment_text, n_tokens) pairs. Sentences longer than a segment
+    are cut on word boundaries.
+    """
+    segment_tokens = segment_tokens or SUMMARY_SEGMENT_TOKENS
+    sentences = [s for s in _SENT_SPLIT.split(text) if s.strip()]
+    if not sentences:
+        return []
+    tokenizer, _ = load()
+    with _tok_lock:
+        lengths = [len(ids) for ids in
+                   tokenizer(sentences, add_special_tokens=False, verbose=False)["input_ids"]]
+
+    segments, cur, cur_len = [], [], 0
+    for sent, n in zip(sentences, lengths):
+        if n > segment_tokens:
+            words = sent.split()
+            step = max(1, int(len(words) * segment_tokens / n))
+            pieces = [" ".join(words[i:i + step]) for i in range(0, len(words), step)]
+            per_piece = n // len(pieces) + 1
+        else:
+            pieces, per_piece = [sent], n
+        for piece in pieces:
+            if cur and cur_len + per_piece > segment_tokens:
+                segments.append((" ".join(cur), cur_len))
+                cur, cur_len = [], 0
+            cur.append(piece)
+            cur_len += per_piece
+    if cur:
+        segments.append((" ".join(cur), cur_len))
+    return segments
+
+
+def summarize_hierarchical(text: str, target_words: int, level: int = 0, generate=None) -> str:
+    """Map: summarize token-bounded segments in batches. Reduce: if the joined
+    partial summaries still exceed the target, summarize them again.
+
+    Only SUMMARY_BATCH_SIZE segments are in a forward pass at a time, so peak
+    memory does not depend on document length. `generate` defaults to
+    _generate (the summarizer server passes its batching queue instead).
+    """
+    generate = generate or _generate
+    segments = split_segments(text)
+    total_tokens = sum(n for _, n in segments) or 1
+    if len(segments) <= 1:
+        return generate([text], [target_words])[0]
+
+    partials = []
+    for i in range(0, len(segments), SUMMARY_BATCH_SIZE):
+        batch = segments[i:i + SUMMARY_BATCH_SIZE]
+        # each segment gets its share of the overall word budget
+        budgets = [max(20, target_words * n // total_tokens) for _, n in batch]
+        partials.extend(generate([t for t, _ in batch], budgets))
+
+    joined = " ".join(p.strip() for p in partials)
+    joined_words = len(joined.split())
+    if joined_words <= target_words * 1.15 or level + 1 >= SUMMARY_MAX_LEVELS:
+        return joined
+    if joined_words >= len(text.split()) * 0.9:
+        return joined   # not shrinking any more; another level would loop
+    return summarize_hierarchical(joined, target_words, level + 1, generate)
+
+
+def summarize_local(text, target_words=50, generate=None):
+    """Summarize with the model loaded in this process."""
+    generate = generate or _generate
+    tokenizer, _ = load()
+    with _tok_lock:
+        n_tokens = len(tokenizer(text, add_special_tokens=False, verbose=False)["input_ids"])
+    if n_tokens > MAX_INPUT_TOKENS - 2:
+        return summarize_hierarchical(text, target_words, generate=generate)
+    return generate([text], [target_words])[0]
+
+
+def bart_summarize(text, target_words=50):
+    if SUMMARIZER_SOCKET:
+        from docs.summarizer_server import get_client
+        return get_client().summarize(text, target_words)
+    return summarize_local(text, target_words)
@@ -0,0 +1,233 @@
+"""BART inference server: one model copy shared by every web worker.
+
+Start it next to the web app and point the workers at its socket:
+
+    python -m docs.summarizer_server                  # listens on SUMMARIZER_SOCKET
+    SUMMARIZER_SOCKET=instance/summarizer.sock flask run
+
+Every connection gets a handler thread that runs the usual map-reduce
+(docs.summarizer.summarize_local), but all forward passes go through one
+batching queue: segments from concurrent requests with the same token budget
+are gathered into a single generate() call of up to SUMMARY_SERVER_MAX_BATCH
+inputs, waiting at most SUMMARY_SERVER_MAX_WAIT_MS for company. Requests beyond
+SUMMARY_SERVER_MAX_PENDING are refused with "busy" instead of queueing forever.
+"""
+import os
+import time
+import queue
+import threading
+from collections import deque
+from concurrent.futures import Future
+from multiprocessing.connection import Listener, Client
+from multiprocessing import AuthenticationError
+
+from docs import summarizer
+
+SUMMARIZER_SOCKET = summarizer.SUMMARIZER_SOCKET or os.path.join("instance", "summarizer.sock")
+SUMMARIZER_AUTHKEY = os.getenv("SUMMARIZER_AUTHKEY", "").encode() or None
+SUMMARIZER_TIMEOUT = float(os.getenv("SUMMARIZER_TIMEOUT", "600"))   # client side, seconds
+SUMMARY_SERVER_MAX_BATCH = int(os.getenv("SUMMARY_SERVER_MAX_BATCH", "8"))
+SUMMARY_SERVER_MAX_WAIT_MS = float(os.getenv("SUMMARY_SERVER_MAX_WAIT_MS", "50"))
+SUMMARY_SERVER_MAX_PENDING = int(os.getenv("SUMMARY_SERVER_MAX_PENDING", "32"))   # requests
+
+
+class SummarizerBusy(Exception):
+    """The server's request queue is full; try again later."""
+
+
+class SummarizerError(Exception):
+    """The server is unreachable, timed out, or failed the request."""
+
+
+class _Item:
+    __slots__ = ("text", "target_words", "bucket", "future")
+
+    def __init__(self, text, target_words):
+        self.text = text
+        self.target_words = target_words
+        # one generate() shares max/min length: only identical budgets batch,
+        # so output does not depend on which other requests are in flight
+        self.bucket = summarizer.token_budget(target_words)
+        self.future = Future()
+
+
+class Batcher:
+    """Gathers single-input generate() calls from many threads into batched
+    forward passes (one token budget each), run one at a time on the batcher
+    thread."""
+
+    def __init__(self, generate_batch=None, max_batch: int = None, max_wait_ms: float = None):
+        self.generate_batch = generate_batch or summarizer._generate
+        self.max_batch = max_batch or SUMMARY_SERVER_MAX_BATCH
+        self.max_wait = (SUMMARY_SERVER_MAX_WAIT_MS if max_wait_ms is None else max_wait_ms) / 1000.0
+        self._queue = queue.Queue()
+        self._deferred = deque()   # items pulled while a different budget was batching
+        self.batches = 0
+        self.items = 0
+
+    def generate(self, texts: list, target_words: list) -> list:
+        """Same contract as summarizer._generate; blocks until all are done."""
+        items = [_Item(t, w) for t, w in zip(texts, target_words)]
+        for item in items:
+            self._queue.put(item)
+        return [item.future.result() for item in items]
+
+    def _next_batch(self):
+        first = self._deferred.popleft() if self._deferred else self._queue.get()
+        batch = [first]
+        for item in list(self._deferred):
+            if len(batch) < self.max_batch and item.bucket == first.bucket:
+                self._deferred.remove(item)
+                batch.append(item)
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            (batch if item.bucket == first.bucket else self._deferred).append(item)
+        return batch
+
+    def run(self):
+        while True:
+            batch = self._next_batch()
+            try:
+                outs = self.generate_batch([i.text for i in batch], [i.target_words for i in batch])
+                for item, out in zip(batch, outs):
+                    item.future.set_result(out)
+            except Exception as e:
+                print("SUMMARIZER BATCH ERROR:", e)
+                for item in batch:
+                    item.future.set_exception(e)
+            self.batches += 1
+            self.items += len(batch)
+
+    def start(self):
+        threading.Thread(target=self.run, name="summarizer-batcher", daemon=True).start()
+        return self
+
+
+class SummarizerServer:
+    def __init__(self, address: str = None, generate_batch=None, max_pending: int = None, **batcher_kw):
+        self.address = address or SUMMARIZER_SOCKET
+        self.batcher = Batcher(generate_batch, **batcher_kw)
+        self.max_pending = max_pending or SUMMARY_SERVER_MAX_PENDING
+        self._pending = threading.BoundedSemaphore(self.max_pending)
+        self.refused = 0
+        self.listener = None
+
+    def _summarize(self, text, target_words):
+        if not self._pending.acquire(blocking=False):
+            self.refused += 1
+            return ("busy", "Summarizer is busy, try again in a moment.")
+        try:
+            return ("ok", summarizer.summarize_local(text, target_words, generate=self.batcher.generate))
+        except Exception as e:
+            print("SUMMARIZER ERROR:", e)
+            return ("error", str(e))
+        finally:
+            self._pending.release()
+
+    def _handle(self, conn):
+        with conn:
+            while True:
+                try:
+                    op, *args = conn.recv()
+                except (EOFError, OSError):
+                    return
+                if op == "summarize":
+                    reply = self._summarize(*args)
+                elif op == "stats":
+                    reply = ("ok", {"batches": self.batcher.batches, "items": self.batcher.items,
+                                    "refused": self.refused})
+                else:
+                    reply = ("error", f"unknown op {op!r}")
+                try:
+                    conn.send(reply)
+                except OSError:
+                    return
+
+    def listen(self):
+        if os.path.exists(self.address):
+            os.remove(self.address)   # stale socket from a previous run
+        os.makedirs(os.path.dirname(os.path.abspath(self.address)), exist_ok=True)
+        self.listener = Listener(self.address, family="AF_UNIX", authkey=SUMMARIZER_AUTHKEY)
+        os.chmod(self.address, 0o600)
+        self.batcher.start()
+        return self
+
+    def serve_forever(self):
+        while True:
+            try:
+                conn = self.listener.accept()
+            except (AuthenticationError, OSError) as e:
+                print("SUMMARIZER ACCEPT ERROR:", e)
+                continue
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+
+class SummarizerClient:
+    """One connection per calling thread, reused across requests."""
+
+    def __init__(self, address: str = None, timeout: float = None):
+        self.address = address or SUMMARIZER_SOCKET
+        self.timeout = SUMMARIZER_TIMEOUT if timeout is None else timeout
+        self._local = threading.local()
+
+    def _drop(self):
+        conn = getattr(self._local, "conn", None)
+        self._local.conn = None
+        if conn is not None:
+            conn.close()
+
+    def _call(self, *msg):
+        for attempt in range(2):   # one reconnect, e.g. after a server restart
+            try:
+                if getattr(self._local, "conn", None) is None:
+                    self._local.conn = Client(self.address, family="AF_UNIX", authkey=SUMMARIZER_AUTHKEY)
+                conn = self._local.conn
+                conn.send(msg)
+                if not conn.poll(self.timeout):
+                    self._drop()   # the late reply must not be read by the next request
+                    raise SummarizerError(f"summarizer server timed out after {self.timeout:.0f}s")
+                status, payload = conn.recv()
+                break
+            except (OSError, EOFError) as e:
+                self._drop()
+                if attempt:
+                    raise SummarizerError(f"summarizer server unavailable: {e}")
+        if status == "busy":
+            raise SummarizerBusy(payload)
+        if status != "ok":
+            raise SummarizerError(payload)
+        return payload
+
+    def summarize(self, text: str, target_words: int) -> str:
+        return self._call("summarize", text, int(target_words))
+
+    def stats(self) -> dict:
+        return self._call("stats")
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> SummarizerClient:
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = SummarizerClient()
+    return _client
+
+
+if __name__ == "__main__":
+    server = SummarizerServer().listen()
+    summarizer.load()
+    print(f"Summarizer server on {server.address} (batch {server.batcher.max_batch}, "
+          f"wait {SUMMARY_SERVER_MAX_WAIT_MS:.0f} ms, max pending {server.max_pending})")
+    server.serve_forever()
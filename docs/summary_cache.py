@@ -0,0 +1,87 @@
+"""Summaries cached by (sha256 of the text, target_words).
+
+Identical documents share entries across users. Each row records the
+summarizer config_version() that produced it: a matching row is served as
+is, a row from an older model/parameters is served immediately while a
+background job recomputes it, and a missing row is computed in the request.
+"""
+import os
+import hashlib
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy.exc import IntegrityError
+from models import db, SummaryCache
+from docs.summarizer import bart_summarize, config_version
+
+SUMMARY_REFRESH_WORKERS = int(os.getenv("SUMMARY_REFRESH_WORKERS", "1"))
+
+_EXECUTOR = ThreadPoolExecutor(max_workers=SUMMARY_REFRESH_WORKERS, thread_name_prefix="summary")
+_in_flight = set()          # (content_sha, target_words) being recomputed by this process
+_in_flight_lock = threading.Lock()
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def compute_summary(text: str, target_words: int) -> str:
+    """BART summary, cut to at most `target_words` words."""
+    raw = bart_summarize(text, target_words)
+    raw_words = raw.split()
+    return " ".join(raw_words[:target_words]) if len(raw_words) > target_words else raw
+
+
+def _store(sha: str, target_words: int, summary: str, version: str):
+    row = db.session.get(SummaryCache, (sha, target_words))
+    if row is None:
+        row = SummaryCache(content_sha=sha, target_words=target_words)
+        db.session.add(row)
+    row.summary, row.version, row.created_at = summary, version, datetime.utcnow()
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()   # a concurrent request stored the same summary first
+
+
+def _refresh(app, sha: str, text: str, target_words: int):
+    with app.app_context():
+        try:
+            version = config_version()
+            _store(sha, target_words, compute_summary(text, target_words), version)
+            print(f"SUMMARY CACHE {sha[:12]}/{target_words}: refreshed for {version}")
+        except Exception as e:
+            print("SUMMARY REFRESH ERROR:", sha[:12], e)
+            db.session.rollback()
+        finally:
+            db.session.remove()
+            with _in_flight_lock:
+                _in_flight.discard((sha, target_words))
+
+
+def _schedule_refresh(app, sha: str, text: str, target_words: int):
+    with _in_flight_lock:
+        if (sha, target_words) in _in_flight:
+            return
+        _in_flight.add((sha, target_words))
+    _EXECUTOR.submit(_refresh, app, sha, text, target_words)
+
+
+def get_summary(app, text: str, target_words: int):
+    """-> (summary, status) with status "hit", "stale" or "miss".
+
+    Only a miss runs the summarizer in the caller's thread (and so can raise
+    SummarizerBusy / SummarizerError).
+    """
+    sha = content_hash(text)
+    row = db.session.get(SummaryCache, (sha, target_words))
+    version = config_version()
+    if row is not None:
+        if row.version != version:
+            _schedule_refresh(app, sha, text, target_words)
+            return row.summary, "stale"
+        return row.summary, "hit"
+
+    summary = compute_summary(text, target_words)
+    _store(sha, target_words, summary, version)
+    return summary, "miss"
@@ -0,0 +1,325 @@
+"""One shared client for every Gemini call (generation, streaming, embeddings).
+
+Calls go through a per-model token bucket (requests and tokens per minute),
+are retried with jittered backoff on transient errors, and identical calls
+already in flight are coalesced into one. LLM_BACKEND=fake swaps Gemini for a
+deterministic offline backend, for load tests and CI without the network.
+"""
+import os
+import time
+import random
+import hashlib
+import threading
+import numpy as np
+
+GEN_MODEL = "models/gemini-2.5-flash"
+EMB_MODEL = "models/text-embedding-004"
+EMB_DIM = 768
+
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini").lower()
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))           # seconds per request
+LLM_RETRIES = int(os.getenv("LLM_RETRIES", "3"))
+LLM_RETRY_BACKOFF = float(os.getenv("LLM_RETRY_BACKOFF", "0.5"))
+# provider quota, per model; 0 disables that limit
+LLM_RPM = int(os.getenv("LLM_RPM", "1000"))
+LLM_TPM = int(os.getenv("LLM_TPM", "1000000"))
+FAKE_TOKEN_DELAY = float(os.getenv("FAKE_TOKEN_DELAY", "0.05"))
+FAKE_LATENCY = float(os.getenv("FAKE_LATENCY", "0"))           # per fake call
+
+# google.api_core exception names worth another try
+_RETRYABLE = {"ResourceExhausted", "TooManyRequests", "ServiceUnavailable", "DeadlineExceeded",
+              "InternalServerError", "GatewayTimeout", "Aborted", "Unknown"}
+
+_lock = threading.Lock()
+_genai = None
+
+
+class LLMError(Exception):
+    """A provider call failed for good (after retries, or not retryable)."""
+
+
+def get_genai():
+    """google.generativeai, imported and configured on first use.
+
+    The import alone costs about a second (grpc + protobuf), which routes like
+    /login never need to pay.
+    """
+    global _genai
+    if _genai is None:
+        with _lock:
+            if _genai is None:
+                import google.generativeai as genai
+                genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+                _genai = genai
+    return _genai
+
+
+def estimate_tokens(text) -> int:
+    if isinstance(text, (list, tuple)):
+        return sum(estimate_tokens(t) for t in text)
+    return len(str(text)) // 4 + 1
+
+
+# ---------------------- rate limiting ----------------------
+class TokenBucket:
+    """`rate` units per minute, bursting up to one minute's worth."""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+        self.stamp = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _reserve(self, n: float) -> float:
+        """Take `n` units (the level may go negative); -> seconds to wait."""
+        with self.lock:
+            now = time.monotonic()
+            self.level = min(self.capacity, self.level + (now - self.stamp) * self.rate)
+            self.stamp = now
+            self.level -= min(n, self.capacity)   # a huge request waits for a full bucket, no longer
+            return 0.0 if self.level >= 0 else -self.level / self.rate
+
+    def acquire(self, n: float = 1, timeout: float = None):
+        if not self.capacity:
+            return
+        wait = self._reserve(n)
+        if timeout is not None and wait > timeout:
+            with self.lock:
+                self.level += min(n, self.capacity)   # give it back
+            raise LLMError(f"rate limited: would wait {wait:.1f}s")
+        if wait:
+            time.sleep(wait)
+
+
+_limiters = {}
+
+
+def _limit(model: str, tokens: int):
+    with _lock:
+        if model not in _limiters:
+            _limiters[model] = (TokenBucket(LLM_RPM), TokenBucket(LLM_TPM))
+        requests, token_bucket = _limiters[model]
+    requests.acquire(1, LLM_TIMEOUT)
+    token_bucket.acquire(tokens, LLM_TIMEOUT)
+
+
+# ---------------------- coalescing ----------------------
+class SingleFlight:
+    """Concurrent calls with the same key share one execution and its result."""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.coalesced = 0
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = {"done": threading.Event(), "result": None, "error": None}
+            else:
+                self.coalesced += 1
+        if not leader:
+            call["done"].wait()
+            if call["error"] is not None:
+                raise call["error"]
+            return call["result"]
+        try:
+            call["result"] = fn()
+            return call["result"]
+        except Exception as e:
+            call["error"] = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call["done"].set()
+
+
+_flight = SingleFlight()
+
+
+def _retrying(fn, retries: int):
+    for attempt in range(retries + 1):
+        try:
+            return fn()
+        except LLMError:
+            raise
+        except Exception as e:
+            transient = type(e).__name__ in _RETRYABLE or isinstance(e, (TimeoutError, ConnectionError))
+            if not transient or attempt == retries:
+                raise LLMError(f"{type(e).__name__}: {e}") from e
+            delay = LLM_RETRY_BACKOFF * (2 ** attempt)
+            delay = random.uniform(delay / 2, delay * 1.5)   # jitter: callers don't retry in lockstep
+            print(f"LLM RETRY {attempt + 1}/{retries} in {delay:.2f}s:", e)
+            time.sleep(delay)
+
+
+def _key(*parts) -> str:
+    h = hashlib.sha256()
+    for p in parts:
+        h.update(repr(p).encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()
+
+
+# ---------------------- backends ----------------------
+class GeminiBackend:
+    """google.generativeai; model objects are created once and reused."""
+
+    def __init__(self):
+        self._models = {}
+
+    def _model(self, name):
+        if name not in self._models:
+            self._models[name] = get_genai().GenerativeModel(name)
+        return self._models[name]
+
+    def generate(self, prompt, model):
+        resp = self._model(model).generate_content(prompt, request_options={"timeout": LLM_TIMEOUT})
+        return getattr(resp, "text", "").strip()
+
+    def stream(self, prompt, model):
+        resp = self._model(model).generate_content(prompt, stream=True, request_options={"timeout": LLM_TIMEOUT})
+        for chunk in resp:
+            try:
+                text = chunk.text
+            except (AttributeError, ValueError):
+                continue   # e.g. a final chunk carrying only finish/safety info
+            if text:
+                yield text
+
+    def embed(self, texts, model):
+        resp = get_genai().embed_content(model=model, content=list(texts), request_options={"timeout": LLM_TIMEOUT})
+        return np.asarray(resp["embedding"], dtype=np.float32)
+
+
+def stub_embed_batch(texts: list[str], dim: int = EMB_DIM, latency: float = 0.0) -> np.ndarray:
+    """Deterministic offline embedder (same text -> same vector).
+
+    `latency` sleeps once per call to mimic a network round-trip, which is
+    what makes batching and concurrency visible in benchmarks.
+    """
+    if latency:
+        time.sleep(latency)
+    out = np.empty((len(texts), dim), dtype=np.float32)
+    for i, t in enumerate(texts):
+        seed = int.from_bytes(hashlib.sha256(t.encode("utf-8")).digest()[:8], "little")
+        out[i] = np.random.default_rng(seed).standard_normal(dim, dtype=np.float32)
+    return out
+
+
+_fake_replies = []
+
+
+def register_fake_reply(fn):
+    """Offline replies for prompts whose output gets parsed (e.g. quiz JSON):
+    fn(prompt) -> reply text, or None to pass. The module that builds the
+    prompt registers it, so llm.py never depends on prompt wording."""
+    _fake_replies.append(fn)
+    return fn
+
+
+class FakeBackend:
+    """Offline stand-in: same prompt -> same reply, no network.
+
+    Prompts claimed by a register_fake_reply() hook get that reply; anything
+    else gets a short pseudo-answer, streamed one word at a time with
+    `token_delay` between words.
+    """
+
+    def __init__(self, token_delay: float = FAKE_TOKEN_DELAY, latency: float = FAKE_LATENCY, n_words: int = 40):
+        self.token_delay = token_delay
+        self.latency = latency
+        self.n_words = n_words
+
+    def _words(self, prompt):
+        digest = hashlib.sha256(str(prompt).encode("utf-8")).hexdigest()
+        return ["(offline", "answer)"] + [digest[i % 60:i % 60 + 4] for i in range(self.n_words - 2)]
+
+    def generate(self, prompt, model):
+        if self.latency:
+            time.sleep(self.latency)
+        for fn in _fake_replies:
+            reply = fn(str(prompt))
+            if reply is not None:
+                return reply
+        return " ".join(self._words(prompt))
+
+    def stream(self, prompt, model):
+        if self.latency:
+            time.sleep(self.latency)
+        for i, w in enumerate(self._words(prompt)):
+            if self.token_delay:
+                time.sleep(self.token_delay)
+            yield w if i == 0 else " " + w
+
+    def embed(self, texts, model):
+        return stub_embed_batch(list(texts), latency=self.latency)
+
+
+_backend = None
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        with _lock:
+            if _backend is None:
+                _backend = FakeBackend() if LLM_BACKEND == "fake" else GeminiBackend()
+    return _backend
+
+
+# ---------------------- public API ----------------------
+def generate(prompt: str, model: str = GEN_MODEL, retries: int = None) -> str:
+    """Full reply text for `prompt`. Raises LLMError."""
+    retries = LLM_RETRIES if retries is None else retries
+
+    def call():
+        _limit(model, estimate_tokens(prompt))
+        return get_backend().generate(prompt, model)
+    return _flight.do(_key("generate", model, prompt), lambda: _retrying(call, retries))
+
+
+def stream(prompt: str, model: str = GEN_MODEL, retries: int = None):
+    """Yield reply text pieces as they arrive. Only opening the stream is
+    retried; once text has been yielded an error is raised as LLMError.
+    Streams are not coalesced (every caller consumes its own)."""
+    retries = LLM_RETRIES if retries is None else retries
+
+    def open_stream():
+        _limit(model, estimate_tokens(prompt))
+        it = iter(get_backend().stream(prompt, model))
+        try:
+            first = next(it)
+        except StopIteration:
+            return None, it
+        return first, it
+
+    first, it = _retrying(open_stream, retries)
+    if first is None:
+        return
+    yield first
+    try:
+        yield from it
+    except Exception as e:
+        raise LLMError(f"{type(e).__name__}: {e}") from e
+
+
+def embed(texts, model: str = EMB_MODEL, retries: int = None) -> np.ndarray:
+    """Raw (unnormalized) embeddings, one row per text; a single string
+    gives a single row. Raises LLMError."""
+    retries = LLM_RETRIES if retries is None else retries
+    batch = [texts] if isinstance(texts, str) else list(texts)
+
+    def call():
+        _limit(model, estimate_tokens(batch))
+        return get_backend().embed(batch, model)
+    return _flight.do(_key("embed", model, batch), lambda: _retrying(call, retries))
+
+
+def stats() -> dict:
+    return {"backend": LLM_BACKEND, "coalesced": _flight.coalesced,
+            "models": sorted(_limiters)}
@@ -0,0 +1,52 @@
+"""Convert existing *.meta.json chunk lists to the mmapped chunk store.
+
+Covers instance/indexes/<doc_id>.meta.json and instance/blobs/<sha>/index.meta.json.
+Safe to re-run: already converted indexes are skipped. Run from the project root:
+
+    python migrate_indexes.py            # convert and delete the JSON files
+    python migrate_indexes.py --keep     # convert, keep the JSON files
+"""
+import argparse
+import glob
+import json
+import os
+
+from docs.chunk_store import ChunkStore, write_chunks
+from docs.index_store import INDEX_DIR
+from docs.blob_store import BLOB_DIR
+
+
+def _targets():
+    for meta_path in glob.glob(os.path.join(INDEX_DIR, "*.meta.json")):
+        yield meta_path, meta_path[:-len(".meta.json")] + ".chunks"
+    for meta_path in glob.glob(os.path.join(BLOB_DIR, "*", "index.meta.json")):
+        yield meta_path, os.path.join(os.path.dirname(meta_path), "index.chunks")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--keep", action="store_true", help="keep the .meta.json files")
+    args = ap.parse_args()
+
+    converted = skipped = 0
+    for meta_path, chunks_path in _targets():
+        if os.path.exists(chunks_path):
+            skipped += 1
+        else:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                chunks = json.load(f).get("chunks", [])
+            write_chunks(chunks_path, chunks)
+            store = ChunkStore(chunks_path)
+            if len(store) != len(chunks) or any(a != b for a, b in zip(store, chunks)):
+                os.remove(chunks_path)
+                print(f"FAILED {meta_path}: round-trip mismatch, left as JSON")
+                continue
+            converted += 1
+            print(f"{meta_path} -> {chunks_path} ({len(chunks)} chunks)")
+        if not args.keep:
+            os.remove(meta_path)
+    print(f"Converted {converted}, already converted {skipped}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,4 @@
+import json
 from datetime import datetime
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
@@ -43,3 +44,106 @@ class QuizResult(db.Model):
 
     def __repr__(self):
         return f"<QuizResult User:{self.user_id} Score:{self.score}/{self.total}>"
+
+# -------------------- Ingestion Job Model --------------------
+class IngestJob(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    document_id = db.Column(db.Integer, db.ForeignKey('document.id'), nullable=False, index=True)
+    save_path = db.Column(db.String(512), nullable=False)
+    status = db.Column(db.String(20), default="queued")   # queued | running | done | failed
+    stage = db.Column(db.String(20), default="queued")    # extract | chunk | embed | index | done
+    progress = db.Column(db.Integer, default=0)           # percent
+    message = db.Column(db.Text)
+    worker = db.Column(db.String(48))                     # "<pid>:<boot token>" of the owning process
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    @property
+    def active(self):
+        return self.status in ("queued", "running")
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "document_id": self.document_id,
+            "status": self.status,
+            "stage": self.stage,
+            "progress": self.progress,
+            "message": self.message,
+        }
+
+    def __repr__(self):
+        return f"<IngestJob {self.id} doc:{self.document_id} {self.status}/{self.stage} {self.progress}%>"
+
+# -------------------- Content-addressed storage --------------------
+class ContentBlob(db.Model):
+    """One uploaded file's bytes + derived data, shared by identical uploads."""
+    sha256 = db.Column(db.String(64), primary_key=True)
+    extracted_text = db.Column(db.Text)
+    status = db.Column(db.String(20), default="pending")   # pending | ready | failed
+    refcount = db.Column(db.Integer, default=0, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<ContentBlob {self.sha256[:12]} refs:{self.refcount} {self.status}>"
+
+
+class DocumentBlob(db.Model):
+    document_id = db.Column(db.Integer, db.ForeignKey('document.id'), primary_key=True)
+    sha256 = db.Column(db.String(64), db.ForeignKey('content_blob.sha256'), nullable=False, index=True)
+
+# -------------------- Question bank --------------------
+class QuizQuestion(db.Model):
+    """A validated, pre-generated quiz question for a document's content."""
+    id = db.Column(db.Integer, primary_key=True)
+    content_key = db.Column(db.String(64), nullable=False, index=True)   # blob sha256, or "doc-<id>"
+    difficulty = db.Column(db.String(10), nullable=False)
+    question = db.Column(db.Text, nullable=False)
+    options = db.Column(db.Text, nullable=False)                          # JSON list of 4 "A) ..." strings
+    correct = db.Column(db.String(1), nullable=False)
+    explanation = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "question": self.question,
+            "options": json.loads(self.options),
+            "correct": self.correct,
+            "explanation": self.explanation,
+        }
+
+    def __repr__(self):
+        return f"<QuizQuestion {self.id} {self.content_key[:12]} {self.difficulty}>"
+
+
+class QuizSeen(db.Model):
+    """Bank questions a user has already been served."""
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    question_id = db.Column(db.Integer, db.ForeignKey('quiz_question.id'), primary_key=True)
+
+# -------------------- Quiz attempts (server-side quiz state) --------------------
+class QuizAttempt(db.Model):
+    id = db.Column(db.String(32), primary_key=True)                      # random hex; the only thing in the cookie
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    document_id = db.Column(db.Integer)
+    questions = db.Column(db.Text, nullable=False)                       # JSON list, immutable once created
+    total = db.Column(db.Integer, nullable=False)
+    score = db.Column(db.Integer, default=0, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+
+class QuizAttemptAnswer(db.Model):
+    """One row per answered question; the primary key makes "already answered" an insert conflict."""
+    attempt_id = db.Column(db.String(32), db.ForeignKey('quiz_attempt.id'), primary_key=True)
+    qid = db.Column(db.Integer, primary_key=True)
+
+# -------------------- Summary cache --------------------
+class SummaryCache(db.Model):
+    """Summary of one extracted text at one target length, shared by identical documents."""
+    content_sha = db.Column(db.String(64), primary_key=True)             # sha256 of the extracted text
+    target_words = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.String(200), nullable=False)                  # model + parameters that produced it
+    summary = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -0,0 +1,149 @@
+import os
+import json
+import uuid
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from sqlalchemy.exc import IntegrityError
+from models import db, QuizAttempt, QuizAttemptAnswer
+
+# where in-progress quizzes live: "sql" (shared by all workers) or "memory" (single process)
+QUIZ_ATTEMPT_STORE = os.getenv("QUIZ_ATTEMPT_STORE", "sql").lower()
+QUIZ_ATTEMPT_TTL = int(os.getenv("QUIZ_ATTEMPT_TTL", str(6 * 3600)))   # seconds
+
+
+class Attempt:
+    __slots__ = ("id", "user_id", "document_id", "questions", "score", "answered")
+
+    def __init__(self, id, user_id, document_id, questions, score=0, answered=None):
+        self.id = id
+        self.user_id = user_id
+        self.document_id = document_id
+        self.questions = questions
+        self.score = score
+        self.answered = answered if answered is not None else set()
+
+    @property
+    def total(self):
+        return len(self.questions)
+
+
+class MemoryAttemptStore:
+    """Attempts in a dict with a TTL; fine for a single worker process."""
+
+    def __init__(self, ttl: int):
+        self.ttl = ttl
+        self._items = {}   # id -> (Attempt, expires at)
+        self._lock = threading.Lock()
+
+    def _prune(self, now):
+        for k in [k for k, (_, exp) in self._items.items() if exp < now]:
+            del self._items[k]
+
+    def create(self, user_id, document_id, questions) -> str:
+        a = Attempt(uuid.uuid4().hex, user_id, document_id, questions)
+        now = datetime.utcnow()
+        with self._lock:
+            self._prune(now)
+            self._items[a.id] = (a, now + timedelta(seconds=self.ttl))
+        return a.id
+
+    def get(self, attempt_id, user_id):
+        with self._lock:
+            item = self._items.get(attempt_id)
+            if item is None or item[1] < datetime.utcnow() or item[0].user_id != user_id:
+                return None
+            return item[0]
+
+    def answer(self, attempt_id, user_id, qid: int, correct: bool):
+        """Record an answer once. -> new score, or None if the attempt is gone"""
+        with self._lock:
+            item = self._items.get(attempt_id)
+            if item is None or item[0].user_id != user_id:
+                return None
+            a = item[0]
+            if qid not in a.answered:
+                a.answered.add(qid)
+                a.score += int(correct)
+            return a.score
+
+    def delete(self, attempt_id):
+        with self._lock:
+            self._items.pop(attempt_id, None)
+
+
+class SqlAttemptStore:
+    """Attempts in the app database, so every worker process sees them.
+
+    Questions never change after creation, so parsed copies are kept in a
+    small per-process LRU instead of re-parsing the JSON on every check.
+    """
+
+    def __init__(self, ttl: int, parsed_cache_size: int = 256):
+        self.ttl = ttl
+        self._parsed = OrderedDict()
+        self._parsed_max = parsed_cache_size
+        self._lock = threading.Lock()
+
+    def _questions(self, row):
+        with self._lock:
+            qs = self._parsed.get(row.id)
+            if qs is not None:
+                self._parsed.move_to_end(row.id)
+                return qs
+        qs = json.loads(row.questions)
+        with self._lock:
+            self._parsed[row.id] = qs
+            while len(self._parsed) > self._parsed_max:
+                self._parsed.popitem(last=False)
+        return qs
+
+    def create(self, user_id, document_id, questions) -> str:
+        now = datetime.utcnow()
+        expired = db.session.query(QuizAttempt.id).filter(QuizAttempt.expires_at < now)
+        QuizAttemptAnswer.query.filter(QuizAttemptAnswer.attempt_id.in_(expired)).delete(synchronize_session=False)
+        QuizAttempt.query.filter(QuizAttempt.expires_at < now).delete(synchronize_session=False)
+        row = QuizAttempt(id=uuid.uuid4().hex, user_id=user_id, document_id=document_id,
+                          questions=json.dumps(questions), total=len(questions), score=0,
+                          expires_at=now + timedelta(seconds=self.ttl))
+        db.session.add(row)
+        db.session.commit()
+        return row.id
+
+    def get(self, attempt_id, user_id):
+        row = db.session.get(QuizAttempt, attempt_id) if attempt_id else None
+        if row is None or row.user_id != user_id or row.expires_at < datetime.utcnow():
+            return None
+        return Attempt(row.id, row.user_id, row.document_id, self._questions(row), row.score)
+
+    def answer(self, attempt_id, user_id, qid: int, correct: bool):
+        # callers get() the attempt first, which checks ownership and expiry
+        try:
+            db.session.add(QuizAttemptAnswer(attempt_id=attempt_id, qid=qid))
+            db.session.flush()
+            if correct:
+                QuizAttempt.query.filter_by(id=attempt_id, user_id=user_id).update(
+                    {"score": QuizAttempt.score + 1}, synchronize_session=False)
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()   # already answered: the first answer counts
+        return (db.session.query(QuizAttempt.score)
+                .filter_by(id=attempt_id, user_id=user_id).scalar())
+
+    def delete(self, attempt_id):
+        QuizAttemptAnswer.query.filter_by(attempt_id=attempt_id).delete(synchronize_session=False)
+        QuizAttempt.query.filter_by(id=attempt_id).delete(synchronize_session=False)
+        db.session.commit()
+        with self._lock:
+            self._parsed.pop(attempt_id, None)
+
+
+def _make_store():
+    if QUIZ_ATTEMPT_STORE == "memory":
+        return MemoryAttemptStore(QUIZ_ATTEMPT_TTL)
+    if QUIZ_ATTEMPT_STORE == "sql":
+        return SqlAttemptStore(QUIZ_ATTEMPT_TTL)
+    raise ValueError(f"QUIZ_ATTEMPT_STORE must be sql or memory, got {QUIZ_ATTEMPT_STORE!r}")
+
+
+ATTEMPTS = _make_store()
@@ -0,0 +1,132 @@
+import os
+import json
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import func
+from models import db, QuizQuestion, QuizSeen, DocumentBlob
+from quiz.generation import generate_questions
+
+DIFFICULTIES = ("easy", "medium", "hard")
+
+# questions generated per difficulty right after ingestion
+QUIZ_BANK_INITIAL = int(os.getenv("QUIZ_BANK_INITIAL", "15"))
+# refill when a user has fewer unseen questions than this left
+QUIZ_BANK_LOW_WATER = int(os.getenv("QUIZ_BANK_LOW_WATER", "10"))
+QUIZ_BANK_REFILL = int(os.getenv("QUIZ_BANK_REFILL", "15"))
+QUIZ_BANK_MAX = int(os.getenv("QUIZ_BANK_MAX", "300"))   # per content + difficulty
+QUIZ_BANK_WORKERS = int(os.getenv("QUIZ_BANK_WORKERS", "1"))
+
+_EXECUTOR = ThreadPoolExecutor(max_workers=QUIZ_BANK_WORKERS, thread_name_prefix="quizbank")
+_in_flight = set()          # (content_key, difficulty) being filled by this process
+_in_flight_lock = threading.Lock()
+
+
+def content_key(doc_id: int) -> str:
+    """Questions are shared by every document with the same content blob."""
+    link = db.session.get(DocumentBlob, doc_id)
+    return link.sha256 if link else f"doc-{doc_id}"
+
+
+def _norm(text: str) -> str:
+    return re.sub(r"\W+", " ", text.lower()).strip()
+
+
+def pool_size(key: str, difficulty: str) -> int:
+    return QuizQuestion.query.filter_by(content_key=key, difficulty=difficulty).count()
+
+
+def add_questions(key: str, difficulty: str, questions: list) -> list:
+    """Store cleaned questions, skipping ones already banked. -> stored rows"""
+    existing = {_norm(q) for (q,) in db.session.query(QuizQuestion.question)
+                .filter_by(content_key=key, difficulty=difficulty)}
+    rows = []
+    for q in questions:
+        n = _norm(q["question"])
+        if n in existing:
+            continue
+        existing.add(n)
+        rows.append(QuizQuestion(content_key=key, difficulty=difficulty, question=q["question"],
+                                 options=json.dumps(q["options"]), correct=q["correct"],
+                                 explanation=q["explanation"]))
+    db.session.add_all(rows)
+    db.session.commit()
+    return rows
+
+
+def draw(user_id: int, key: str, difficulty: str, num: int) -> list:
+    """Up to `num` random banked questions the user has not been served yet
+    (one query), marked as seen. -> list of question dicts"""
+    seen = db.session.query(QuizSeen.question_id).filter(QuizSeen.user_id == user_id)
+    rows = (QuizQuestion.query
+            .filter(QuizQuestion.content_key == key,
+                    QuizQuestion.difficulty == difficulty,
+                    ~QuizQuestion.id.in_(seen))
+            .order_by(func.random())
+            .limit(num)
+            .all())
+    mark_seen(user_id, rows)
+    return [r.to_dict() for r in rows]
+
+
+def mark_seen(user_id: int, rows: list):
+    if rows:
+        db.session.add_all(QuizSeen(user_id=user_id, question_id=r.id) for r in rows)
+        db.session.commit()
+
+
+def unseen_count(user_id: int, key: str, difficulty: str) -> int:
+    seen = db.session.query(QuizSeen.question_id).filter(QuizSeen.user_id == user_id)
+    return (QuizQuestion.query
+            .filter(QuizQuestion.content_key == key, QuizQuestion.difficulty == difficulty,
+                    ~QuizQuestion.id.in_(seen))
+            .count())
+
+
+# ---------------------- background filling ----------------------
+def _fill(app, doc_id: int, key: str, difficulty: str, count: int):
+    from models import Document
+    with app.app_context():
+        try:
+            doc = db.session.get(Document, doc_id)
+            if doc is None or not (doc.extracted_text or "").strip():
+                return
+            count = min(count, QUIZ_BANK_MAX - pool_size(key, difficulty))
+            if count <= 0:
+                return
+            stored = add_questions(key, difficulty, generate_questions(doc, count, difficulty))
+            print(f"QUIZ BANK {key[:12]}/{difficulty}: +{len(stored)} questions")
+        except Exception as e:
+            print("QUIZ BANK ERROR:", doc_id, difficulty, e)
+            db.session.rollback()
+        finally:
+            db.session.remove()
+            with _in_flight_lock:
+                _in_flight.discard((key, difficulty))
+
+
+def schedule_fill(app, doc_id: int, difficulties=DIFFICULTIES, count: int = None):
+    """Generate questions for `doc_id` in the background, at most one fill
+    per content and difficulty at a time in this process."""
+    key = content_key(doc_id)
+    for difficulty in difficulties:
+        with _in_flight_lock:
+            if (key, difficulty) in _in_flight:
+                continue
+            _in_flight.add((key, difficulty))
+        _EXECUTOR.submit(_fill, app, doc_id, key, difficulty, count or QUIZ_BANK_REFILL)
+
+
+def maybe_refill(app, user_id: int, doc_id: int, difficulty: str):
+    """Top the pool up when this user is running out of unseen questions."""
+    key = content_key(doc_id)
+    if unseen_count(user_id, key, difficulty) < QUIZ_BANK_LOW_WATER and pool_size(key, difficulty) < QUIZ_BANK_MAX:
+        schedule_fill(app, doc_id, (difficulty,))
+
+
+def forget_content(key: str):
+    """Drop the banked questions of content nobody references any more."""
+    ids = db.session.query(QuizQuestion.id).filter(QuizQuestion.content_key == key)
+    QuizSeen.query.filter(QuizSeen.question_id.in_(ids)).delete(synchronize_session=False)
+    QuizQuestion.query.filter_by(content_key=key).delete(synchronize_session=False)
+    db.session.commit()
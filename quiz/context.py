@@ -0,0 +1,110 @@
+import os
+import numpy as np
+from docs.index_store import load_index_and_meta
+
+# Token budget of the document context pasted into a quiz prompt
+QUIZ_CONTEXT_MIN_TOKENS = int(os.getenv("QUIZ_CONTEXT_MIN_TOKENS", "1500"))
+QUIZ_CONTEXT_MAX_TOKENS = int(os.getenv("QUIZ_CONTEXT_MAX_TOKENS", "12000"))
+
+# harder questions need more surrounding material per question ...
+TOKENS_PER_QUESTION = {"easy": 200, "medium": 300, "hard": 450}
+# ... and a wider spread of the document (lower lambda = more diversity)
+MMR_LAMBDA = {"easy": 0.7, "medium": 0.6, "hard": 0.45}
+
+WORDS_PER_TOKEN = 0.75
+QUIZ_SLICE_MIN_WORDS = int(os.getenv("QUIZ_SLICE_MIN_WORDS", "300"))
+
+
+def context_budget(num_questions: int, difficulty: str) -> int:
+    per_q = TOKENS_PER_QUESTION.get(difficulty, TOKENS_PER_QUESTION["medium"])
+    return max(QUIZ_CONTEXT_MIN_TOKENS, min(QUIZ_CONTEXT_MAX_TOKENS, num_questions * per_q))
+
+
+def _estimate_tokens(text: str) -> int:
+    return int(len(text.split()) / WORDS_PER_TOKEN) + 1
+
+
+def _chunk_vectors(index, chunks):
+    from docs.embedding import EMB_MODEL
+    from docs.embedding_store import EMBEDDING_STORE, chunk_key
+    keys = [chunk_key(c, EMB_MODEL) for c in chunks]
+    vecs = EMBEDDING_STORE.get_many(keys)
+    if all(k in vecs for k in keys):
+        return np.vstack([vecs[k] for k in keys]).astype(np.float32)
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def mmr_select(X: np.ndarray, costs: list, budget: int, lam: float) -> list:
+    """Greedy maximal marginal relevance under a token budget.
+
+    Relevance is similarity to the document centroid (how representative a
+    chunk is); the penalty is similarity to the closest chunk already picked.
+    Rows of X are L2-normalized. -> picked row numbers, in pick order.
+    """
+    n = X.shape[0]
+    centroid = X.mean(axis=0)
+    centroid /= np.linalg.norm(centroid) + 1e-12
+    relevance = X @ centroid
+    closest = np.full(n, -1.0, dtype=np.float32)   # max sim to the picked set
+    available = np.ones(n, dtype=bool)
+    picked, spent = [], 0
+    smallest = min(costs)
+    while available.any() and budget - spent >= smallest:
+        score = lam * relevance - (1 - lam) * np.maximum(closest, 0)
+        score[~available] = -np.inf
+        i = int(np.argmax(score))
+        available[i] = False
+        if spent + costs[i] > budget:
+            continue   # too big for what is left; a smaller chunk may still fit
+        picked.append(i)
+        spent += costs[i]
+        closest = np.maximum(closest, X @ X[i])
+    return picked
+
+
+def _selected_chunks(doc, num_questions: int, difficulty: str):
+    """-> list of text pieces in document order totalling at most the budget."""
+    text = doc.extracted_text or ""
+    budget = context_budget(num_questions, difficulty)
+    if _estimate_tokens(text) <= budget:
+        return [text]
+
+    index, meta = load_index_and_meta(doc.id)
+    chunks = meta.get("chunks", []) if meta else []
+    if index is None or not len(chunks) or index.ntotal != len(chunks):
+        return [" ".join(text.split()[:int(budget * WORDS_PER_TOKEN)])]
+
+    chunks = list(chunks)
+    X = _chunk_vectors(index, chunks)
+    costs = [_estimate_tokens(c) for c in chunks]
+    picked = mmr_select(X, costs, budget, MMR_LAMBDA.get(difficulty, MMR_LAMBDA["medium"]))
+    return [chunks[i] for i in sorted(picked)]
+
+
+def select_quiz_context(doc, num_questions: int, difficulty: str) -> str:
+    """Document text for a quiz prompt, bounded by context_budget().
+
+    Short documents are used whole. Longer ones are reduced to a diverse,
+    representative set of chunks from the document's FAISS index, kept in
+    document order; without an index the text is truncated to the budget.
+    """
+    return "\n\n---\n\n".join(_selected_chunks(doc, num_questions, difficulty))
+
+
+def select_quiz_contexts(doc, num_questions: int, difficulty: str, n_shards: int) -> list:
+    """Split the selected context into `n_shards` contiguous slices, one per
+    generation call, so each call covers a different part of the document.
+    Documents too short to go around are shared between shards."""
+    pieces = _selected_chunks(doc, num_questions, difficulty)
+    if len(pieces) == 1:
+        # a single block (short document or no index): split it by words
+        # (at least QUIZ_SLICE_MIN_WORDS each, so every slice has something to ask about)
+        words = pieces[0].split()
+        n = max(1, min(n_shards, len(words) // QUIZ_SLICE_MIN_WORDS))
+        pieces = [" ".join(words[i * len(words) // n:(i + 1) * len(words) // n]) for i in range(n)]
+    groups = [[] for _ in range(min(n_shards, len(pieces)))]
+    per = -(-len(pieces) // len(groups))
+    for i, p in enumerate(pieces):
+        groups[i // per].append(p)
+    texts = ["\n\n---\n\n".join(g) for g in groups if g]
+    return [texts[i % len(texts)] for i in range(n_shards)]
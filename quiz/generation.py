@@ -0,0 +1,230 @@
+import os
+import json
+import re
+import hashlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import llm
+from llm import GEN_MODEL
+from quiz.context import select_quiz_context, select_quiz_contexts
+
+# Large requests are split into shards of at most this many questions, each
+# generated concurrently over a different slice of the document.
+QUIZ_SHARD_SIZE = int(os.getenv("QUIZ_SHARD_SIZE", "10"))
+QUIZ_GEN_WORKERS = int(os.getenv("QUIZ_GEN_WORKERS", "4"))
+QUIZ_SHARD_RETRIES = int(os.getenv("QUIZ_SHARD_RETRIES", "1"))
+# questions whose word sets overlap at least this much count as duplicates
+QUIZ_DEDUPE_JACCARD = float(os.getenv("QUIZ_DEDUPE_JACCARD", "0.8"))
+
+LABELS = ["A", "B", "C", "D"]
+
+
+class QuizGenerationError(Exception):
+    """Generation or parsing failed; str(e) is safe to show the user."""
+
+
+def extract_json_block(text: str) -> str:
+    """Extract JSON block from Gemini output"""
+    if not isinstance(text, str):
+        return ""
+    fenced = re.search(r"```(?:json)?(.*?)```", text, re.S | re.I)
+    if fenced:
+        text = fenced.group(1).strip()
+    start = text.find("[")
+    end = text.rfind("]")
+    return text[start:end + 1] if start != -1 and end != -1 else text
+
+
+def build_quiz_prompt(text: str, num: int, difficulty: str) -> str:
+    # Enhanced prompt for high-quality, context-aware questions
+    return f"""
+You are an expert AI educator. Generate {num} high-quality multiple-choice questions (difficulty: {difficulty})
+based strictly on the DOCUMENT TEXT below.
+
+For each question:
+- Provide a clear question derived from the document.
+- Provide 4 complete, distinct options labeled "A)", "B)", "C)", "D)".
+- Ensure one correct answer and three plausible distractors.
+- Avoid dummy options like "Option 1" or unrelated words.
+- Add a one-sentence explanation for the correct answer.
+- Output only valid JSON, e.g.:
+[
+  {{
+    "question": "...",
+    "options": ["A) ...", "B) ...", "C) ...", "D) ..."],
+    "correct": "B",
+    "explanation": "..."
+  }}
+]
+
+DOCUMENT TEXT:
+{text}
+"""
+
+
+_PROMPT_NUM = re.compile(r"Generate (\d+) high-quality multiple-choice")   # see build_quiz_prompt
+
+
+@llm.register_fake_reply
+def fake_quiz_reply(prompt: str):
+    """LLM_BACKEND=fake: well-formed question JSON built from the document
+    text of a build_quiz_prompt() prompt; None for any other prompt."""
+    m = _PROMPT_NUM.search(prompt)
+    if not m:
+        return None
+    digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:8]
+    text = prompt.split("DOCUMENT TEXT:", 1)[-1]
+    words = list(dict.fromkeys(w.lower() for w in re.findall(r"[A-Za-z]{5,}", text))) or ["document"]
+    questions = []
+    for i in range(int(m.group(1))):
+        w = words[(i * 7919) % len(words)]   # distinct topics while the text has them
+        questions.append({
+            "question": f"Offline question {digest}-{i + 1}: what does the document say about {w}?",
+            "options": [f"A) {w} as first described", f"B) {w} as the document explains it",
+                        f"C) {w} in an unrelated sense", "D) None of the above statements"],
+            "correct": "B",
+            "explanation": f"The document discusses {w}.",
+        })
+    return "```json\n" + json.dumps(questions) + "\n```"
+
+
+def clean_question(q) -> dict:
+    """Normalize one generated question; None if it is unusable
+    (no question text, or fewer than 4 real options)."""
+    if not isinstance(q, dict):
+        return None
+    question = str(q.get("question", "")).strip()
+    opts = q.get("options", [])
+    if not isinstance(opts, list):
+        if isinstance(opts, str):
+            opts = re.split(r"[\n;|]", opts)
+        else:
+            opts = list(opts) if opts else []
+
+    cleaned_opts = []
+    for o in opts:
+        t = str(o).strip()
+        t = re.sub(r"^[A-D][\)\.\-:\s]+", "", t, flags=re.I).strip()
+        if len(t.split()) > 1:
+            cleaned_opts.append(t)
+        elif str(o).strip():
+            cleaned_opts.append(str(o).strip())
+
+    if not question or len(cleaned_opts) < 4:
+        return None
+
+    final_opts = [
+        f"{LABELS[i]}) {cleaned_opts[i]}" for i in range(4)
+    ]
+
+    corr = q.get("correct", "")
+    try:
+        if isinstance(corr, list):
+            corr = "".join(map(str, corr))
+        corr = str(corr).strip().upper()
+    except Exception:
+        corr = "A"
+
+    corr_match = re.search(r"[A-D]", corr)
+    corr_letter = corr_match.group(0) if corr_match else "A"
+
+    explanation = q.get("explanation") or "No explanation provided."
+
+    return {
+        "question": question,
+        "options": final_opts,
+        "correct": corr_letter,
+        "explanation": str(explanation)
+    }
+
+
+def parse_questions(raw: str) -> list:
+    """Gemini reply -> list of cleaned questions (may be empty)."""
+    json_str = extract_json_block(raw)
+    try:
+        data = json.loads(json_str)
+        assert isinstance(data, list) and len(data) > 0
+    except Exception as e:
+        print("PARSE ERROR:", e, "RAW:", raw)
+        raise QuizGenerationError("Quiz generation failed to parse JSON. Try again.")
+    return [c for c in map(clean_question, data) if c]
+
+
+def _generate_once(text: str, num: int, difficulty: str) -> list:
+    """One Gemini call for `num` questions over `text`."""
+    prompt = build_quiz_prompt(text, num, difficulty)
+    try:
+        raw = llm.generate(prompt, GEN_MODEL)
+    except llm.LLMError as e:
+        print("GENERATION ERROR:", e)
+        raise QuizGenerationError("Quiz generation failed. Please try again.")
+    questions = parse_questions(raw)
+    if not questions:
+        raise QuizGenerationError("Quiz generation failed to parse JSON. Try again.")
+    return questions
+
+
+def _generate_shard(text: str, num: int, difficulty: str) -> list:
+    """A shard is retried on its own; the others keep their results."""
+    for attempt in range(QUIZ_SHARD_RETRIES + 1):
+        try:
+            return _generate_once(text, num, difficulty)
+        except QuizGenerationError as e:
+            if attempt == QUIZ_SHARD_RETRIES:
+                raise
+            print(f"QUIZ SHARD RETRY {attempt + 1}:", e)
+
+
+def _words(text: str) -> set:
+    return set(re.findall(r"\w+", text.lower()))
+
+
+def dedupe_questions(questions: list, threshold: float = QUIZ_DEDUPE_JACCARD) -> list:
+    """Drop questions whose wording is near-identical (Jaccard over word sets)
+    to one kept earlier."""
+    kept, kept_words = [], []
+    for q in questions:
+        w = _words(q["question"])
+        if any(len(w & k) / (len(w | k) or 1) >= threshold for k in kept_words):
+            continue
+        kept.append(q)
+        kept_words.append(w)
+    return kept
+
+
+def shard_sizes(num: int) -> list:
+    """num -> near-equal shard sizes of at most QUIZ_SHARD_SIZE."""
+    n = max(1, -(-num // max(1, QUIZ_SHARD_SIZE)))
+    return [num // n + (1 if i < num % n else 0) for i in range(n)]
+
+
+def generate_questions(doc, num: int, difficulty: str) -> list:
+    """`num` questions over bounded slices of `doc`.
+
+    Small requests are one Gemini call. Larger ones fan out to parallel calls
+    of at most QUIZ_SHARD_SIZE questions, each over its own slice of the
+    selected context; a failed shard does not sink the others. Results are
+    merged in shard order and near-duplicates dropped, so fewer than `num`
+    may come back. Raises QuizGenerationError only if every shard failed.
+    """
+    sizes = shard_sizes(num)
+    if len(sizes) == 1:
+        # bounded, diverse slice of the document instead of the whole text
+        return dedupe_questions(_generate_once(select_quiz_context(doc, num, difficulty), num, difficulty))
+
+    # context selection reads the DB and index, so it stays on this thread
+    texts = select_quiz_contexts(doc, num, difficulty, len(sizes))
+    results, error = [None] * len(sizes), None
+    with ThreadPoolExecutor(max_workers=min(QUIZ_GEN_WORKERS, len(sizes)),
+                            thread_name_prefix="quizgen") as pool:
+        futures = {pool.submit(_generate_shard, t, n, difficulty): i
+                   for i, (t, n) in enumerate(zip(texts, sizes))}
+        for fut in as_completed(futures):
+            try:
+                results[futures[fut]] = fut.result()
+            except QuizGenerationError as e:
+                print(f"QUIZ SHARD {futures[fut]} FAILED:", e)
+                error = e
+    merged = [q for r in results if r for q in r]
+    if not merged:
+        raise error or QuizGenerationError("Quiz generation failed. Please try again.")
+    return dedupe_questions(merged)[:num]
@@ -0,0 +1,95 @@
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+
+from docs.index_store import on_index_change
+
+# cosine similarity at which two questions count as "the same question"
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+ANSWER_CACHE_MAX_PER_DOC = int(os.getenv("ANSWER_CACHE_MAX_PER_DOC", "256"))
+ANSWER_CACHE_MAX_DOCS = int(os.getenv("ANSWER_CACHE_MAX_DOCS", "1024"))
+
+
+class _DocAnswers:
+    __slots__ = ("version", "vecs", "entries")
+
+    def __init__(self, version, dim):
+        self.version = version
+        self.vecs = np.zeros((0, dim), dtype=np.float32)
+        self.entries = []
+
+
+class AnswerCache:
+    """Per-document cache of generated answers, looked up by query embedding.
+
+    Query vectors are L2-normalized, so one matrix-vector product against the
+    document's cached questions gives every cosine similarity at once.
+    Entries are keyed by the document's index storage key, so documents that
+    share a content blob share answers. `version` is the index stamp; a
+    different stamp means it was re-indexed and everything cached is dropped.
+    """
+
+    def __init__(self, threshold: float, max_per_doc: int, max_docs: int):
+        self.threshold = threshold
+        self.max_per_doc = max_per_doc
+        self.max_docs = max_docs
+        self._docs = OrderedDict()   # storage key -> _DocAnswers
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, doc_id, qv: np.ndarray, version=None):
+        qv = np.asarray(qv, dtype=np.float32).ravel()
+        with self._lock:
+            bucket = self._docs.get(doc_id)
+            if bucket is not None and bucket.version != version:
+                del self._docs[doc_id]
+                bucket = None
+            if bucket is None or not bucket.entries:
+                self.misses += 1
+                return None
+            sims = bucket.vecs @ qv
+            best = int(np.argmax(sims))
+            if sims[best] < self.threshold:
+                self.misses += 1
+                return None
+            self._docs.move_to_end(doc_id)
+            self.hits += 1
+            return dict(bucket.entries[best], cache_similarity=float(sims[best]))
+
+    def store(self, doc_id, qv: np.ndarray, entry: dict, version=None):
+        qv = np.asarray(qv, dtype=np.float32).reshape(1, -1)
+        with self._lock:
+            bucket = self._docs.get(doc_id)
+            if bucket is None or bucket.version != version:
+                bucket = _DocAnswers(version, qv.shape[1])
+                self._docs[doc_id] = bucket
+            bucket.vecs = np.vstack([bucket.vecs, qv])
+            bucket.entries.append(entry)
+            if len(bucket.entries) > self.max_per_doc:
+                bucket.vecs = bucket.vecs[1:]
+                bucket.entries.pop(0)
+            self._docs.move_to_end(doc_id)
+            while len(self._docs) > self.max_docs:
+                self._docs.popitem(last=False)
+
+    def invalidate(self, doc_id):
+        with self._lock:
+            self._docs.pop(doc_id, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "documents": len(self._docs),
+                "entries": sum(len(b.entries) for b in self._docs.values()),
+                "threshold": self.threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+ANSWER_CACHE = AnswerCache(ANSWER_CACHE_THRESHOLD, ANSWER_CACHE_MAX_PER_DOC, ANSWER_CACHE_MAX_DOCS)
+on_index_change(ANSWER_CACHE.invalidate)
@@ -0,0 +1,144 @@
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+
+QUERY_CACHE_PATH = os.path.join("instance", "query_cache.sqlite")
+QUERY_CACHE_HOT_SIZE = int(os.getenv("QUERY_CACHE_HOT_SIZE", "2048"))
+QUERY_CACHE_MAX_ROWS = int(os.getenv("QUERY_CACHE_MAX_ROWS", "100000"))
+QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", str(30 * 24 * 3600)))  # seconds
+
+_PRUNE_EVERY = 256  # writes between TTL/size sweeps of the disk tier
+
+
+def normalize_query(text: str) -> str:
+    """'  What is Overfitting? ' and 'what is overfitting' share one key."""
+    text = re.sub(r"\s+", " ", (text or "").strip().lower())
+    return text.rstrip(" ?!.")
+
+
+def cache_key(model: str, text: str) -> str:
+    return hashlib.sha256(f"{model}\x00{normalize_query(text)}".encode("utf-8")).hexdigest()
+
+
+class QueryEmbeddingCache:
+    """Query-embedding memo: hot in-memory LRU in front of a SQLite table.
+
+    Both tiers honour the TTL; the disk tier is also trimmed to `max_rows`
+    (least recently used first) so it survives restarts without growing
+    forever.
+    """
+
+    def __init__(self, path: str, hot_size: int, max_rows: int, ttl: float):
+        self.path = os.path.abspath(path)
+        self.hot_size = hot_size
+        self.max_rows = max_rows
+        self.ttl = ttl
+        self._hot = OrderedDict()   # key -> (vector, created)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._writes = 0
+        self.hot_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    # ---------- sqlite ----------
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS query_embeddings ("
+                " key TEXT PRIMARY KEY, model TEXT, vec BLOB,"
+                " created REAL, last_used REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_qe_last_used ON query_embeddings(last_used)")
+            self._local.conn = conn
+        return conn
+
+    def _prune(self, conn, now):
+        conn.execute("DELETE FROM query_embeddings WHERE created < ?", (now - self.ttl,))
+        conn.execute(
+            "DELETE FROM query_embeddings WHERE key IN ("
+            " SELECT key FROM query_embeddings ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+            (self.max_rows,),
+        )
+
+    # ---------- hot tier ----------
+    def _hot_put(self, key, vec, created):
+        with self._lock:
+            self._hot[key] = (vec, created)
+            self._hot.move_to_end(key)
+            while len(self._hot) > self.hot_size:
+                self._hot.popitem(last=False)
+
+    # ---------- public API ----------
+    def get(self, model: str, text: str):
+        key = cache_key(model, text)
+        now = time.time()
+        with self._lock:
+            entry = self._hot.get(key)
+            if entry is not None:
+                if now - entry[1] <= self.ttl:
+                    self._hot.move_to_end(key)
+                    self.hot_hits += 1
+                    return entry[0]
+                del self._hot[key]
+
+        conn = self._conn()
+        row = conn.execute(
+            "SELECT vec, created FROM query_embeddings WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None or now - row[1] > self.ttl:
+            with self._lock:
+                self.misses += 1
+            return None
+        conn.execute("UPDATE query_embeddings SET last_used = ? WHERE key = ?", (now, key))
+        conn.commit()
+        vec = np.frombuffer(row[0], dtype=np.float32)
+        self._hot_put(key, vec, row[1])
+        with self._lock:
+            self.disk_hits += 1
+        return vec
+
+    def put(self, model: str, text: str, vec: np.ndarray):
+        key = cache_key(model, text)
+        now = time.time()
+        vec = np.ascontiguousarray(vec, dtype=np.float32)
+        vec.setflags(write=False)
+        self._hot_put(key, vec, now)
+
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO query_embeddings (key, model, vec, created, last_used)"
+            " VALUES (?, ?, ?, ?, ?)",
+            (key, model, vec.tobytes(), now, now),
+        )
+        with self._lock:
+            self._writes += 1
+            prune = self._writes % _PRUNE_EVERY == 0
+        if prune:
+            self._prune(conn, now)
+        conn.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hot_hits + self.disk_hits + self.misses
+            return {
+                "hot_entries": len(self._hot),
+                "hot_hits": self.hot_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.hot_hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+            }
+
+
+QUERY_CACHE = QueryEmbeddingCache(
+    QUERY_CACHE_PATH, QUERY_CACHE_HOT_SIZE, QUERY_CACHE_MAX_ROWS, QUERY_CACHE_TTL
+)
@@ -1,58 +1,37 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, Response, stream_with_context, current_app
 from flask_login import login_required, current_user
 from models import Document
 import os, json, numpy as np
-import faiss
-import google.generativeai as genai
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import llm
+from docs.index_store import INDEX_CACHE, index_key, key_version
+from rag.query_cache import QUERY_CACHE, normalize_query
+from docs.embedding_store import EMBEDDING_STORE
+from rag.answer_cache import ANSWER_CACHE
+from docs.ingest import is_indexing
+from docs.library_index import search_library_many, chunk_texts, library_version, library_docs
+from rag.streaming import sse
 
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-GEN_MODEL = "models/gemini-2.5-flash"
-EMB_MODEL = "models/text-embedding-004"
-
-INDEX_DIR = os.path.join("instance", "indexes")
+from llm import EMB_MODEL
 
 rag_bp = Blueprint('rag_bp', __name__)
 
-def get_latest_doc(user_id: int):
-    return Document.query.filter_by(user_id=user_id).order_by(Document.id.desc()).first()
-
-def embed_query_gemini(text: str) -> np.ndarray:
-    resp = genai.embed_content(model=EMB_MODEL, content=text)
-    v = np.array(resp["embedding"], dtype=np.float32)
-    n = np.linalg.norm(v) + 1e-12
-    return v / n   # normalized
-
-def load_index_and_meta(doc_id: int):
-    faiss_path = os.path.join(INDEX_DIR, f"{doc_id}.faiss")
-    meta_path  = os.path.join(INDEX_DIR, f"{doc_id}.meta.json")
-    if not (os.path.exists(faiss_path) and os.path.exists(meta_path)):
-        return None, None
-    index = faiss.read_index(faiss_path)
-    with open(meta_path, "r", encoding="utf-8") as f:
-        meta = json.load(f)
-    return index, meta
-
-def search_chunks(doc_id: int, query: str, top_k=4):
-    index, meta = load_index_and_meta(doc_id)
-    if index is None or meta is None:
-        return 0.0, []
-
-    qv = embed_query_gemini(query).reshape(1, -1).astype(np.float32)
-    scores, idxs = index.search(qv, top_k)  # cosine via IP (normalized)
-    scores = scores[0]
-    idxs   = idxs[0]
-
-    chunks = meta.get("chunks", [])
-    results = []
-    for sc, ix in zip(scores, idxs):
-        if ix == -1:
-            continue
-        if ix < len(chunks):
-            results.append((float(sc), chunks[ix]))
-
-    top_sim = results[0][0] if results else 0.0
-    top_chunks = [c for _, c in results]
-    return top_sim, top_chunks
+# /rag/batch limits
+RAG_BATCH_MAX_QUESTIONS = int(os.getenv("RAG_BATCH_MAX_QUESTIONS", "100"))
+RAG_BATCH_WORKERS = int(os.getenv("RAG_BATCH_WORKERS", "16"))   # concurrent generations per request
+
+def embed_queries(questions: list) -> np.ndarray:
+    """Normalized query vectors, one row per question; QUERY_CACHE misses
+    are embedded together in one batched call."""
+    vecs = [QUERY_CACHE.get(EMB_MODEL, q) for q in questions]
+    missing = [i for i, v in enumerate(vecs) if v is None]
+    if missing:
+        X = llm.embed([questions[i] for i in missing], EMB_MODEL)
+        X = X / (np.linalg.norm(X, axis=1, keepdims=True) + 1e-12)
+        for i, v in zip(missing, X):
+            QUERY_CACHE.put(EMB_MODEL, questions[i], v)
+            vecs[i] = v
+    return np.vstack(vecs).astype(np.float32)
 
 def build_grounded_prompt(context_chunks, question):
     ctx = "\n\n---\n\n".join(context_chunks)
@@ -79,50 +58,314 @@ QUESTION:
 {question}
 """
 
+FOUND_THRESHOLD = 0.25  # >= threshold => treat as "found in PDF"
+
+def prepare_answer(user_id: int, question: str, doc_id: int = None) -> dict:
+    """Everything up to (but not including) generation.
+
+    Searches the user's whole library, or only `doc_id` when given. Returns
+    the retrieval results and the prompt to send; if a near-identical
+    question was already answered over the same scope, `answer` is filled in
+    from the answer cache and `cached` is True.
+    """
+    return prepare_answers(user_id, [question], doc_id)[0]
+
+def prepare_answers(user_id: int, questions: list, doc_id: int = None) -> list:
+    """prepare_answer() for several questions: one batched embedding call
+    and one index search over the matrix of uncached queries."""
+    Q = embed_queries(questions)
+    if doc_id is None:
+        key = ("library", user_id)
+        version = library_version(user_id)
+    else:
+        # answers are shared by every document backed by the same content blob
+        key = index_key(doc_id)
+        version = key_version(key)
+    states, todo = [None] * len(questions), []
+    for i, qv in enumerate(Q):
+        cached = ANSWER_CACHE.lookup(key, qv, version)
+        if cached:
+            # doc-scoped entries are shared across users: name the caller's own document
+            ref_id = doc_id if doc_id is not None else cached["reference_doc_id"]
+            states[i] = {**cached, "cached": True, "prompt": None,
+                         "reference_doc": _doc_filename(user_id, ref_id) if cached["found_in_pdf"] else None}
+        else:
+            todo.append(i)
+    if todo:
+        hit_lists = search_library_many(user_id, Q[todo], top_k=4,
+                                        doc_ids=[doc_id] if doc_id is not None else None)
+        for i, hits in zip(todo, hit_lists):
+            states[i] = _answer_state(user_id, questions[i], hits, Q[i], key, version)
+    return states
+
+def _doc_filename(user_id: int, doc_id):
+    ref = Document.query.filter_by(id=doc_id, user_id=user_id).first() if doc_id else None
+    return ref.filename if ref else None
+
+def _answer_state(user_id: int, question: str, hits: list, qv, key, version) -> dict:
+    retrieved_chunks = chunk_texts(hits)
+    similarity_top = hits[0][0] if hits else 0.0
+    found_in_pdf = bool(similarity_top >= FOUND_THRESHOLD and retrieved_chunks)
+    reference_doc_id = reference_doc = None
+    if found_in_pdf:
+        prompt = build_grounded_prompt(retrieved_chunks, question)
+        reference_doc_id = hits[0][1]
+        reference_doc = _doc_filename(user_id, reference_doc_id)
+    else:
+        prompt = build_open_prompt(question)
+    return {
+        "answer": None,
+        "reference_chunk": retrieved_chunks[0] if found_in_pdf else None,
+        "reference_doc": reference_doc,
+        "reference_doc_id": reference_doc_id,
+        "retrieved": retrieved_chunks,
+        "found_in_pdf": found_in_pdf,
+        "similarity_top": float(similarity_top),
+        "cached": False,
+        "prompt": prompt,
+        "qv": qv,
+        "key": key,
+        "version": version,
+    }
+
+def remember_answer(state: dict, answer: str):
+    # no filename: it is resolved per caller on a hit (see prepare_answers)
+    ANSWER_CACHE.store(state["key"], state["qv"], {
+        "answer": answer,
+        "reference_chunk": state["reference_chunk"],
+        "reference_doc_id": state["reference_doc_id"],
+        "retrieved": state["retrieved"],
+        "found_in_pdf": state["found_in_pdf"],
+        "similarity_top": state["similarity_top"],
+    }, state["version"])
+
+def resolve_scope(user_id: int, doc_id):
+    """Check what a question will search. -> (error message or None, status code).
+
+    `doc_id` None means the whole library; it only needs one indexed document.
+    409 means "still indexing": the question will work once ingest finishes.
+    """
+    docs = Document.query.filter_by(user_id=user_id).with_entities(Document.id).all()
+    if not docs:
+        return "Please upload a document first.", 400
+    if doc_id is not None:
+        if doc_id not in {d.id for d in docs}:
+            return "Document not found.", 404
+        if is_indexing(doc_id):
+            return "This document is still indexing.", 409
+        return None, 200
+    if not library_docs(user_id):
+        return "Your documents are still indexing.", 409
+    return None, 200
+
 @rag_bp.route('/doubt_resolver', methods=['GET', 'POST'])
+@rag_bp.route('/doubt_resolver/<int:doc_id>', methods=['GET', 'POST'], endpoint='doubt_resolver_doc')
 @login_required
-def doubt_resolver():
-    # latest doc only
-    latest = get_latest_doc(current_user.id)
-    if not latest:
-        flash("Please upload a document first.")
+def doubt_resolver(doc_id=None):
+    # whole library by default; /doubt_resolver/<doc_id> or a doc_id field narrows it
+    if doc_id is None:
+        doc_id = request.values.get('doc_id', type=int)
+    error, status = resolve_scope(current_user.id, doc_id)
+    if error:
+        flash(error + (" The Doubt Resolver will be ready in a moment." if status == 409 else ""))
         return redirect(url_for('docs_bp.upload'))
 
     answer = None
     reference_chunk = None
+    reference_doc = None
     retrieved_chunks = []
     found_in_pdf = False
     similarity_top = 0.0
 
-    threshold = 0.25  # >= threshold => treat as "found in PDF"
-
     if request.method == 'POST':
         question = (request.form.get('question') or "").strip()
         if not question:
             flash("Please type a question.")
-            return redirect(url_for('rag_bp.doubt_resolver'))
+            return redirect(request.path)
 
-        similarity_top, retrieved_chunks = search_chunks(latest.id, question, top_k=4)
-        model = genai.GenerativeModel(GEN_MODEL)
+        state = prepare_answer(current_user.id, question, doc_id)
+        answer = state["answer"]
+        if not state["cached"]:
+            try:
+                answer = llm.generate(state["prompt"])
+            except llm.LLMError as e:   # provider down or rate limited
+                print("DOUBT RESOLVER ERROR:", e)
+                flash("Answer generation failed. Please try again.")
+                return redirect(request.path)
+            remember_answer(state, answer)
 
-        if similarity_top >= threshold and retrieved_chunks:
-            found_in_pdf = True
-            prompt = build_grounded_prompt(retrieved_chunks, question)
-            resp = model.generate_content(prompt)
-            answer = getattr(resp, "text", str(resp))
-            reference_chunk = retrieved_chunks[0]
-        else:
-            found_in_pdf = False
-            prompt = build_open_prompt(question)
-            resp = model.generate_content(prompt)
-            answer = getattr(resp, "text", str(resp))
-            reference_chunk = None
+        reference_chunk = state["reference_chunk"]
+        reference_doc = state["reference_doc"]
+        retrieved_chunks = state["retrieved"]
+        found_in_pdf = state["found_in_pdf"]
+        similarity_top = state["similarity_top"]
 
+    documents = Document.query.filter_by(user_id=current_user.id).order_by(Document.id.desc()).all()
     return render_template(
         'doubt_resolver.html',
         answer=answer,
         retrieved=retrieved_chunks,
         found_in_pdf=found_in_pdf,
         reference_chunk=reference_chunk,
-        similarity_top=round(float(similarity_top), 3)
+        reference_doc=reference_doc,
+        similarity_top=round(float(similarity_top), 3),
+        documents=documents,
+        selected_doc_id=doc_id
+    )
+
+@rag_bp.route('/doubt_resolver/stream', methods=['GET', 'POST'])
+@login_required
+def doubt_resolver_stream():
+    """Server-sent events: `retrieval` first, then `token`s, then `done`.
+
+    GET ?question=... works with EventSource; POST (form or JSON) is what
+    the doubt resolver page uses. An optional doc_id limits the search to
+    one document.
+    """
+    payload = request.get_json(silent=True) or {}
+    question = (payload.get("question") or request.values.get("question") or "").strip()
+    if not question:
+        return jsonify({"error": "Please type a question."}), 400
+    doc_id = payload.get("doc_id") or request.values.get("doc_id")
+    try:
+        doc_id = int(doc_id) if doc_id else None
+    except (TypeError, ValueError):
+        return jsonify({"error": "Invalid doc_id"}), 400
+
+    error, status = resolve_scope(current_user.id, doc_id)
+    if error:
+        return jsonify({"error": error}), status
+    user_id = current_user.id
+
+    def events():
+        # an immediate comment line gets headers + first byte out before any API call
+        yield ": stream open\n\n"
+        try:
+            state = prepare_answer(user_id, question, doc_id)
+            yield sse("retrieval", {
+                "similarity_top": round(state["similarity_top"], 3),
+                "found_in_pdf": state["found_in_pdf"],
+                "reference_chunk": state["reference_chunk"],
+                "reference_doc": state["reference_doc"],
+                "retrieved": state["retrieved"],
+                "cached": state["cached"],
+            })
+            if state["cached"]:
+                yield sse("token", {"text": state["answer"]})
+            else:
+                parts = []
+                for text in llm.stream(state["prompt"]):
+                    parts.append(text)
+                    yield sse("token", {"text": text})
+                remember_answer(state, "".join(parts))
+            yield sse("done", {})
+        except Exception as e:
+            print("STREAM ERROR:", e)
+            yield sse("error", {"error": "Answer generation failed. Please try again."})
+
+    return Response(
+        stream_with_context(events()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
+
+@rag_bp.route('/rag/batch', methods=['POST'])
+@login_required
+def batch_answer():
+    """Answer a list of questions in one request (teachers, LMS integrations).
+
+    JSON body: {"questions": [...], "doc_id": optional, "stream": optional}.
+    All questions are embedded in one call and searched in one index.search;
+    identical questions are answered once, and generations run concurrently
+    (RAG_BATCH_WORKERS). Returns {"results": [...]} in input order, or with
+    "stream": true (or Accept: application/x-ndjson) one JSON line per
+    question, in completion order, each carrying its input `index`.
+    """
+    payload = request.get_json(silent=True) or {}
+    questions = payload.get("questions")
+    if (not isinstance(questions, list) or not questions
+            or not all(isinstance(q, str) and q.strip() for q in questions)):
+        return jsonify({"error": "questions must be a non-empty list of non-empty strings"}), 400
+    if len(questions) > RAG_BATCH_MAX_QUESTIONS:
+        return jsonify({"error": f"At most {RAG_BATCH_MAX_QUESTIONS} questions per request."}), 400
+    try:
+        doc_id = int(payload["doc_id"]) if payload.get("doc_id") else None
+    except (TypeError, ValueError):
+        return jsonify({"error": "Invalid doc_id"}), 400
+    stream = bool(payload.get("stream")) or request.accept_mimetypes.best == "application/x-ndjson"
+
+    error, status = resolve_scope(current_user.id, doc_id)
+    if error:
+        return jsonify({"error": error}), status
+
+    # identical questions (case, spacing, trailing "?") share one answer
+    slots, unique, slot_of = {}, [], []
+    for q in questions:
+        norm = normalize_query(q)
+        if norm not in slots:
+            slots[norm] = len(unique)
+            unique.append(q.strip())
+        slot_of.append(slots[norm])
+    states = prepare_answers(current_user.id, unique, doc_id)
+    answers = {i: st["answer"] for i, st in enumerate(states) if st["cached"]}
+    errors = {}
+
+    def result(j):
+        st, i = states[slot_of[j]], slot_of[j]
+        out = {"index": j, "question": questions[j], "answer": answers.get(i),
+               "found_in_pdf": st["found_in_pdf"], "similarity_top": round(st["similarity_top"], 3),
+               "reference_doc": st["reference_doc"], "reference_chunk": st["reference_chunk"],
+               "cached": st["cached"]}
+        if i in errors:
+            out["error"] = errors[i]
+        return out
+
+    def finished():
+        """Yield unique-question numbers as their answers arrive."""
+        yield from answers
+        todo = [i for i in range(len(unique)) if i not in answers]
+        if not todo:
+            return
+        pool = ThreadPoolExecutor(max_workers=min(RAG_BATCH_WORKERS, len(todo)), thread_name_prefix="ragbatch")
+        try:
+            futures = {pool.submit(llm.generate, states[i]["prompt"]): i for i in todo}
+            for fut in as_completed(futures):
+                i = futures[fut]
+                try:
+                    answers[i] = fut.result()
+                    remember_answer(states[i], answers[i])
+                except Exception as e:
+                    print("BATCH ANSWER ERROR:", e)
+                    errors[i] = "Answer generation failed. Please try again."
+                yield i
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)   # client went away mid-stream
+
+    if not stream:
+        for _ in finished():
+            pass
+        return jsonify({"results": [result(j) for j in range(len(questions))], "unique": len(unique)})
+
+    inputs_of = {}
+    for j, i in enumerate(slot_of):
+        inputs_of.setdefault(i, []).append(j)
+
+    def lines():
+        for i in finished():
+            for j in inputs_of[i]:
+                yield json.dumps(result(j), ensure_ascii=False) + "\n"
+
+    return Response(lines(), mimetype="application/x-ndjson", headers={"X-Accel-Buffering": "no"})
+
+@rag_bp.route('/rag/cache_stats')
+@login_required
+def cache_stats():
+    if current_user.username not in current_app.config.get("ADMIN_USERS", ()):
+        return jsonify({"error": "Admins only."}), 403
+    return jsonify({
+        "index_cache": INDEX_CACHE.stats(),
+        "query_embedding_cache": QUERY_CACHE.stats(),
+        "answer_cache": ANSWER_CACHE.stats(),
+        "chunk_embedding_store": EMBEDDING_STORE.stats(),
+        "llm": llm.stats(),
+    })
@@ -0,0 +1,6 @@
+import json
+
+
+def sse(event: str, data) -> str:
+    """Format one server-sent event; `data` is JSON-encoded on a single line."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
@@ -0,0 +1,39 @@
+import os
+import sys
+import pytest
+from flask import Flask
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import db, User, Document
+
+
+@pytest.fixture
+def app(tmp_path):
+    """Bare app on a throwaway sqlite file (a file, so threads share it)."""
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{tmp_path / 'test.db'}"
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+
+
+@pytest.fixture
+def user(app):
+    u = User(username="u", email="u@example.com", password="x")
+    db.session.add(u)
+    db.session.commit()
+    return u
+
+
+@pytest.fixture
+def make_doc(user):
+    def make(filename="a.txt"):
+        doc = Document(user_id=user.id, filename=filename)
+        db.session.add(doc)
+        db.session.commit()
+        return doc.id
+    return make
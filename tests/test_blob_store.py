@@ -0,0 +1,120 @@
+import os
+import threading
+import pytest
+
+from models import db, ContentBlob, DocumentBlob, IngestJob
+from docs import blob_store
+
+SHA = "ab" * 32
+
+
+@pytest.fixture(autouse=True)
+def blob_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(blob_store, "BLOB_DIR", str(tmp_path / "blobs"))
+
+
+@pytest.fixture
+def upload(tmp_path):
+    n = [0]
+
+    def make(data=b"same bytes"):
+        n[0] += 1
+        path = tmp_path / f"upload-{n[0]}"
+        path.write_bytes(data)
+        return str(path)
+    return make
+
+
+def queue_job(doc_id, status="queued"):
+    db.session.add(IngestJob(user_id=1, document_id=doc_id, save_path="x", status=status))
+    db.session.commit()
+
+
+def test_acquire_shares_one_blob(make_doc, upload):
+    a, b = make_doc(), make_doc()
+    first, second = upload(), upload()
+    blob_store.acquire(SHA, a, first, "a.txt")
+    blob = blob_store.acquire(SHA, b, second, "a.txt")
+
+    assert blob.refcount == 2
+    assert blob_store.existing_source(SHA).endswith("source.txt")
+    assert not os.path.exists(first) and not os.path.exists(second)
+    assert blob_store.blob_for_doc(a) == blob_store.blob_for_doc(b) == SHA
+
+
+def test_claim_once_per_active_job(make_doc, upload):
+    a, b = make_doc(), make_doc()
+    blob_store.acquire(SHA, a, upload(), "a.txt")
+    blob_store.acquire(SHA, b, upload(), "a.txt")
+
+    assert blob_store.claim(SHA)
+    queue_job(a)
+    assert not blob_store.claim(SHA)
+
+
+def test_claim_again_after_failed_job(make_doc, upload):
+    a = make_doc()
+    blob_store.acquire(SHA, a, upload(), "a.txt")
+    assert blob_store.claim(SHA)
+    queue_job(a, status="failed")
+    assert blob_store.claim(SHA)
+
+
+def test_claim_ready_blob(make_doc, upload):
+    a = make_doc()
+    blob_store.acquire(SHA, a, upload(), "a.txt")
+    blob_store.mark_ready(SHA, "some text")
+    assert not blob_store.claim(SHA)
+
+
+def test_concurrent_claims_start_one_job(app, make_doc, upload):
+    docs = [make_doc() for _ in range(4)]
+    for d in docs:
+        blob_store.acquire(SHA, d, upload(), "a.txt")
+    db.session.remove()
+
+    start = threading.Barrier(len(docs))
+    won, errors = [], []
+
+    def worker(doc_id):
+        # what upload() does: claim, then add the job in the same transaction
+        with app.app_context():
+            try:
+                start.wait()
+                if blob_store.claim(SHA):
+                    won.append(doc_id)
+                    queue_job(doc_id)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                db.session.remove()
+
+    threads = [threading.Thread(target=worker, args=(d,)) for d in docs]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert not errors
+    assert len(won) == 1
+    assert IngestJob.query.count() == 1
+
+
+def test_release_keeps_blob_until_last_reference(make_doc, upload):
+    a, b = make_doc(), make_doc()
+    blob_store.acquire(SHA, a, upload(), "a.txt")
+    blob_store.acquire(SHA, b, upload(), "a.txt")
+
+    assert blob_store.release(a)
+    db.session.expire_all()
+    assert db.session.get(ContentBlob, SHA).refcount == 1
+    assert os.path.isdir(blob_store.blob_dir(SHA))
+
+    assert blob_store.release(b)
+    assert db.session.get(ContentBlob, SHA) is None
+    assert DocumentBlob.query.count() == 0
+    assert not os.path.exists(blob_store.blob_dir(SHA))
+
+
+def test_release_pre_dedup_document(make_doc):
+    assert blob_store.release(make_doc()) is False
@@ -0,0 +1,36 @@
+import pytest
+
+from quiz.attempts import MemoryAttemptStore, SqlAttemptStore
+
+QUESTIONS = [{"question": f"q{i}", "correct": "A"} for i in range(3)]
+
+
+@pytest.fixture(params=["sql", "memory"])
+def store(request, app):
+    return SqlAttemptStore(ttl=3600) if request.param == "sql" else MemoryAttemptStore(ttl=3600)
+
+
+def test_resubmitted_answer_keeps_first(store, user):
+    attempt_id = store.create(user.id, None, QUESTIONS)
+
+    assert store.answer(attempt_id, user.id, 0, True) == 1
+    # same question again, right or wrong: the first answer counts
+    assert store.answer(attempt_id, user.id, 0, True) == 1
+    assert store.answer(attempt_id, user.id, 0, False) == 1
+
+    assert store.answer(attempt_id, user.id, 1, False) == 1
+    assert store.answer(attempt_id, user.id, 1, True) == 1
+    assert store.answer(attempt_id, user.id, 2, True) == 2
+    assert store.get(attempt_id, user.id).score == 2
+
+
+def test_attempt_belongs_to_its_user(store, user):
+    attempt_id = store.create(user.id, None, QUESTIONS)
+    assert store.get(attempt_id, user.id + 1) is None
+    assert store.get(attempt_id, user.id).total == len(QUESTIONS)
+
+
+def test_deleted_attempt_is_gone(store, user):
+    attempt_id = store.create(user.id, None, QUESTIONS)
+    store.delete(attempt_id)
+    assert store.get(attempt_id, user.id) is None